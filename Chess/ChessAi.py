@@ -1,8 +1,240 @@
+import json
+import os
 import random
+import time
+from Chess import ChessEngine
+from Chess import ChessBook
+from Chess import ChessBitbase
 
 piece_points = {'K': 20000, 'Q': 900, 'R': 500, 'N': 330, 'B': 330, 'p': 100}
 CHECKMATE = 100000
 STALEMATE = 0
+DRAW = 0
+# transposition table bound types
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+# memory budget of the transposition table in megabytes
+TT_SIZE_MB = 16
+# rough cost of one table entry in bytes, used to turn the memory budget into a number of entries
+TT_ENTRY_BYTES = 96
+tt = None
+# polyglot opening book probed before searching, opened from BOOK_PATH the first time the file is there
+USE_BOOK = True
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.bin')
+book = None
+# king and pawn, rook or queen against king tables probed inside the search, opened from BITBASE_DIR
+# the first time it exists, their mates score below a mate the search found and their pawn wins below that
+USE_BITBASES = True
+BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bitbases')
+bitbases = None
+BITBASE_MATE = 50000
+BITBASE_WIN = 40000
+# deepest iteration iterative deepening will start
+MAX_DEPTH = 64
+# how many nodes are searched between checks of the time and node budgets
+CHECK_INTERVAL = 1024
+# quiescence captures that can't lift the score this close to alpha are skipped
+DELTA_MARGIN = 200
+# selective search, each part can be switched off to measure what it brings
+USE_NULL_MOVE = True
+USE_LMR = True
+USE_FUTILITY = True
+USE_REVERSE_FUTILITY = True
+# null move pruning lets the opponent move twice and cuts the node if a search shallower by
+# NULL_MOVE_REDUCTION + 1 plies still fails high, with less than NULL_VERIFY_MATERIAL of pieces besides
+# pawns the side to move may be in zugzwang so a cutoff is only taken once a reduced normal search agrees
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_REDUCTION = 2
+NULL_VERIFY_MATERIAL = 900
+# late move reductions search quiet moves from the LMR_MOVES-th on one ply shallower, two plies from the
+# LMR_DEEP_MOVES-th, and again at full depth when they beat alpha
+LMR_MIN_DEPTH = 3
+LMR_MOVES = 3
+LMR_DEEP_MOVES = 6
+# futility pruning skips quiet moves in nodes this far from the horizon whose static score plus the margin
+# for the remaining depth can't reach alpha, reverse futility cuts nodes whose static score beats beta by
+# the margin
+FUTILITY_MARGINS = [0, 200, 300, 500]
+REVERSE_FUTILITY_MARGIN = 120
+# principal variation search gives every move after the first a zero width window and only searches it
+# again with the full window when it beats alpha
+USE_PVS = True
+# from ASPIRATION_MIN_DEPTH on an iteration starts with a window of ASPIRATION_WINDOW around the last score,
+# doubling the window on the side that fails until the score falls inside it
+USE_ASPIRATION = True
+ASPIRATION_MIN_DEPTH = 4
+ASPIRATION_WINDOW = 50
+# move ordering scores, captures go by most valuable victim then least valuable attacker,
+# then the two killer moves of the ply, then quiet moves by their history score
+ORDER_VALUES = {'p': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6}
+# ordering and material values looked up by piece code, an empty square is worth nothing
+PIECE_ORDER = [ORDER_VALUES[name[1]] for name in ChessEngine.PIECE_NAMES[:12]] + [0]
+PIECE_GAIN = [piece_points[name[1]] for name in ChessEngine.PIECE_NAMES[:12]] + [0]
+PROMOTION_ORDER = [ORDER_VALUES[piece] for piece in ChessEngine.PROMOTION_PIECES]
+PROMOTION_GAIN = [piece_points[piece] - piece_points['p'] for piece in ChessEngine.PROMOTION_PIECES]
+EMPTY = ChessEngine.EMPTY
+# flags of moves that win material without landing on an occupied square
+NOISY_FLAGS = ChessEngine.MOVE_ENPASSANT | ChessEngine.MOVE_PROMOTION
+HASH_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000
+KILLER_SCORE = 90000
+# history scores are halved once one passes this so quiet moves stay below the killers
+HISTORY_LIMIT = 50000
+MAX_PLY = 128
+# killer moves per ply and history scores per piece code and target square, reset by get_negamax_move
+killers = [[None, None] for ply in range(MAX_PLY)]
+history = [[0] * 64 for piece in range(12)]
+# search progress and budgets, reset by get_negamax_move, quiescence nodes are counted apart
+nodes = 0
+q_nodes = 0
+deadline = None
+node_limit = None
+completed_depth = 0
+# optional event shared with other processes or threads, setting it stops the search once a move is ready
+stop_event = None
+# best line of the last completed iteration, followed first by the next iteration
+pv_line = []
+follow_pv = False
+# triangular principal variation table, row ply holds the best line found from that ply in entries ply to
+# pv_lengths[ply] - 1 and is built from row ply + 1 whenever a move raises alpha
+pv_table = [[None] * (MAX_PLY + 1) for ply in range(MAX_PLY + 1)]
+pv_lengths = [0] * (MAX_PLY + 1)
+# beta cutoffs in the main search and how many came on the first move searched, and the seconds spent
+# generating moves, evaluating and ordering moves, reset by get_negamax_move and copied into its SearchStats
+cutoffs = 0
+first_move_cutoffs = 0
+movegen_time = 0.0
+eval_time = 0.0
+order_time = 0.0
+timer = time.perf_counter
+# statistics of the last search
+search_stats = None
+# file every search appends its statistics to as one json line, None to not log them
+STATS_LOG = None
+
+
+# raised inside the search when the time or node budget runs out
+class SearchTimeout(Exception):
+    pass
+
+
+# work done by one search, returned by get_negamax_move alongside the move it puts on the queue
+class SearchStats:
+    def __init__(self):
+        self.move = None
+        self.depth = 0
+        self.nodes = 0
+        self.q_nodes = 0
+        self.seconds = 0.0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        # (depth, seconds, nodes searched so far) of every completed iteration
+        self.iterations = []
+        self.movegen_time = 0.0
+        self.eval_time = 0.0
+        self.order_time = 0.0
+        # True when the move came from the opening book without a search
+        self.book = False
+
+    @property
+    def nodes_per_second(self) -> int:
+        return int((self.nodes + self.q_nodes) / self.seconds) if self.seconds > 0 else 0
+
+    # share of beta cutoffs on the first move searched, a measure of the move ordering
+    @property
+    def first_move_cutoff_rate(self) -> float:
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def tt_hit_rate(self) -> float:
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def as_dict(self) -> dict:
+        return {'move': ChessEngine.move_to_uci(self.move) if self.move is not None else None,
+                'depth': self.depth, 'nodes': self.nodes, 'q_nodes': self.q_nodes, 'seconds': self.seconds,
+                'nps': self.nodes_per_second, 'cutoffs': self.cutoffs, 'first_move_cutoffs': self.first_move_cutoffs,
+                'first_move_cutoff_rate': self.first_move_cutoff_rate, 'tt_probes': self.tt_probes,
+                'tt_hits': self.tt_hits, 'tt_hit_rate': self.tt_hit_rate, 'iterations': self.iterations,
+                'movegen_time': self.movegen_time, 'eval_time': self.eval_time, 'order_time': self.order_time,
+                'book': self.book}
+
+    # appends the statistics to a file as one json line
+    def log(self, path):
+        with open(path, 'a') as file:
+            file.write(json.dumps(self.as_dict()) + '\n')
+
+
+# fixed size transposition table kept in flat lists indexed by the low bits of the zobrist key
+# entries sit in pairs, the first slot keeps the deepest search and the second is always replaced
+class TranspositionTable:
+    def __init__(self, size_mb=TT_SIZE_MB):
+        entries = 2
+        while entries * 2 * TT_ENTRY_BYTES <= size_mb * 1024 * 1024:
+            entries *= 2
+        self.size = entries
+        self.mask = entries - 2
+        self.keys = [0] * entries
+        self.depths = [-1] * entries
+        self.flags = [EXACT] * entries
+        self.scores = [0] * entries
+        self.moves = [None] * entries
+        self.ages = [0] * entries
+        self.age = 0
+        # hit rate counters
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    # returns (depth, flag, score, move id) stored for the key or None
+    def probe(self, key):
+        self.probes += 1
+        i = key & self.mask
+        if self.keys[i] != key:
+            i += 1
+            if self.keys[i] != key:
+                return None
+        if self.depths[i] < 0:
+            return None
+        self.hits += 1
+        return self.depths[i], self.flags[i], self.scores[i], self.moves[i]
+
+    # stores a search result, keeping the deeper or more recent entry in the first slot of the pair, a result
+    # for a position already stored deeper in this search, like a null move verification, is dropped
+    def store(self, key, depth, flag, score, move_id):
+        self.stores += 1
+        i = key & self.mask
+        if self.keys[i] != key and (self.keys[i + 1] == key or self.depths[i] > depth and self.ages[i] == self.age):
+            i += 1
+        if self.keys[i] == key and self.depths[i] > depth and self.ages[i] == self.age:
+            return
+        if self.depths[i] >= 0 and self.keys[i] != key:
+            self.overwrites += 1
+        self.keys[i] = key
+        self.depths[i] = depth
+        self.flags[i] = flag
+        self.scores[i] = score
+        self.moves[i] = move_id
+        self.ages[i] = self.age
+
+    # marks existing entries as old so they are the first to be replaced
+    def new_search(self):
+        self.age += 1
+
+    # fraction of probes that found their position
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    # fraction of slots in use, sampled from the start of the table
+    def usage(self) -> float:
+        sample = min(self.size, 2000)
+        return sum(1 for depth in self.depths[:sample] if depth >= 0) / sample
+
+    # counters used to size the table for a memory budget
+    def stats(self) -> dict:
+        return {'size': self.size, 'probes': self.probes, 'hits': self.hits, 'hit_rate': self.hit_rate(),
+                'stores': self.stores, 'overwrites': self.overwrites, 'usage': self.usage()}
 
 
 
@@ -18,12 +250,126 @@ def get_minmax_move(gs, valid_moves):
     return next_move
 
 
-def get_negamax_move(gs, valid_moves, queue, DEPTH):
-    global next_move
-    next_move = None
+# searches depth 1, 2, 3, ... up to DEPTH until the time limit in seconds or the node limit runs out
+# and puts the best move of the last completed iteration on the queue, report is called as
+# report(depth, move, score, nodes) after every completed iteration, a book move is reported as depth 0
+def get_negamax_move(gs, valid_moves, queue, DEPTH, time_limit=None, max_nodes=None, start_depth=1, report=None):
+    global next_move, tt, nodes, q_nodes, deadline, node_limit, completed_depth, pv_line, follow_pv
+    global killers, history, book, bitbases, search_stats
+    global cutoffs, first_move_cutoffs, movegen_time, eval_time, order_time
+    nodes = 0
+    q_nodes = 0
+    completed_depth = 0
+    cutoffs = first_move_cutoffs = 0
+    movegen_time = eval_time = order_time = 0.0
+    stats = SearchStats()
+    search_stats = stats
+    start_time = time.perf_counter()
+    if USE_BOOK and book is None and os.path.exists(BOOK_PATH):
+        book = ChessBook.PolyglotBook(BOOK_PATH)
+    if book is not None:
+        book_move = book.pick_move(gs)
+        if book_move is not None:
+            if report is not None:
+                report(0, book_move, 0, 0)
+            stats.move = book_move
+            stats.book = True
+            finish_stats(stats, start_time)
+            queue.put(book_move)
+            return stats
+    if USE_BITBASES and bitbases is None and os.path.isdir(BITBASE_DIR):
+        bitbases = ChessBitbase.Bitbases(BITBASE_DIR)
+    # a root whose distance to mate or draw is in the tables needs just one iteration to score every move
+    root_entry = bitbases.probe(gs) if bitbases is not None else None
+    exact_root = root_entry is not None and root_entry[1] >= 0
+    if tt is None:
+        tt = TranspositionTable()
+    tt.new_search()
+    tt_probes, tt_hits = tt.probes, tt.hits
     random.shuffle(valid_moves)
-    negamax(gs, valid_moves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.white_to_move else -1, DEPTH)
-    queue.put(next_move)
+    killers = [[None, None] for ply in range(MAX_PLY)]
+    history = [[0] * 64 for piece in range(12)]
+    pv_line = []
+    # the first iteration always runs to completion so a move is ready
+    deadline = None
+    node_limit = None
+    best_move = None
+    root_ply = gs.ply
+    score = 0
+    for depth in range(start_depth, DEPTH + 1):
+        iteration_start = time.perf_counter()
+        # a window around the last score is cheaper to search, a score outside it searches again wider
+        if USE_ASPIRATION and depth >= ASPIRATION_MIN_DEPTH and completed_depth and abs(score) < BITBASE_WIN:
+            window = ASPIRATION_WINDOW
+            alpha, beta = score - window, score + window
+        else:
+            window = CHECKMATE
+            alpha, beta = -CHECKMATE, CHECKMATE
+        try:
+            while True:
+                next_move = None
+                follow_pv = True
+                score = negamax(gs, valid_moves, depth, alpha, beta, 1 if gs.white_to_move else -1, 0)
+                if alpha < score < beta or window >= CHECKMATE:
+                    break
+                window *= 2
+                if score <= alpha:
+                    alpha = max(score - window, -CHECKMATE)
+                else:
+                    beta = min(score + window, CHECKMATE)
+        except SearchTimeout:
+            # take back the moves of the interrupted iteration
+            while gs.ply > root_ply:
+                gs.undo_move()
+            break
+        best_move = next_move
+        completed_depth = depth
+        stats.iterations.append((depth, time.perf_counter() - iteration_start, nodes + q_nodes))
+        pv_line = pv_table[0][:pv_lengths[0]]
+        if report is not None:
+            report(depth, best_move, score, nodes + q_nodes)
+        if best_move is None or len(valid_moves) == 1 or exact_root:
+            break
+        if time_limit is not None:
+            deadline = start_time + time_limit
+            # the next iteration usually takes several times longer, so don't start one that can't finish
+            if time.perf_counter() - start_time >= time_limit / 2:
+                break
+        if max_nodes is not None:
+            node_limit = max_nodes
+            if nodes + q_nodes >= node_limit:
+                break
+    stats.move = best_move
+    stats.depth = completed_depth
+    stats.tt_probes = tt.probes - tt_probes
+    stats.tt_hits = tt.hits - tt_hits
+    finish_stats(stats, start_time)
+    queue.put(best_move)
+    return stats
+
+
+# copies the search counters into the statistics and logs them if asked to
+def finish_stats(stats, start_time):
+    stats.nodes = nodes
+    stats.q_nodes = q_nodes
+    stats.seconds = time.perf_counter() - start_time
+    stats.cutoffs = cutoffs
+    stats.first_move_cutoffs = first_move_cutoffs
+    stats.movegen_time = movegen_time
+    stats.eval_time = eval_time
+    stats.order_time = order_time
+    if STATS_LOG is not None:
+        stats.log(STATS_LOG)
+
+
+# checks the time and node budgets every CHECK_INTERVAL nodes
+def check_limits():
+    if node_limit is not None and nodes + q_nodes >= node_limit:
+        raise SearchTimeout()
+    if deadline is not None and time.perf_counter() >= deadline:
+        raise SearchTimeout()
+    if stop_event is not None and completed_depth > 0 and stop_event.is_set():
+        raise SearchTimeout()
 
 
 def minmax(gs, valid_moves, depth, white_to_move):
@@ -57,33 +403,337 @@ def minmax(gs, valid_moves, depth, white_to_move):
         return min_score
 
 
-def negamax(gs, valid_moves, depth, alpha, beta, color, DEPTH):
-    global next_move
-    if depth == 0:
-        return color * evaluation_function(gs)
+# alpha-beta search of a node ply plies below the root, the root is given its valid moves and every other node
+# picks its moves itself, null_allowed is False right after a null move so there are never two in a row
+def negamax(gs, valid_moves, depth, alpha, beta, color, ply, null_allowed=True):
+    global next_move, nodes, follow_pv, cutoffs, first_move_cutoffs, movegen_time, order_time
+    pv_lengths[ply] = ply
+    if depth <= 0:
+        return quiescence(gs, alpha, beta, color)
+    nodes += 1
+    if nodes % CHECK_INTERVAL == 0:
+        check_limits()
+    # below the root a position that came up before or has run out of its fifty moves is a draw, since
+    # whatever could be done from it could already have been done the first time
+    if ply and (gs.halfmove_clock >= 100 or gs.is_repetition()):
+        return DRAW
+    # positions in the endgame tables are scored without searching, except at the root where a move is needed
+    if bitbases is not None and ply:
+        score = bitbase_score(gs)
+        if score is not None:
+            return score
+
+    # a deep enough stored result can end the search here, except at the root where a move is needed and
+    # in nodes with an open window, which would lose their part of the principal variation
+    alpha_orig = alpha
+    pv_node = beta - alpha > 1
+    hash_move = None
+    entry = tt.probe(gs.zobrist)
+    if entry is not None:
+        entry_depth, flag, entry_score, hash_move = entry
+        if ply and not pv_node and entry_depth >= depth:
+            if flag == EXACT:
+                return entry_score
+            if flag == LOWER_BOUND and entry_score >= beta:
+                return entry_score
+            if flag == UPPER_BOUND and entry_score <= alpha:
+                return entry_score
+
+    killer_moves = killers[ply]
+    squares = gs.squares
+    # along the previous iteration's best line its move goes first, then the stored best move
+    pv_move = None
+    if follow_pv:
+        pv_move = pv_line[ply] if ply < len(pv_line) else None
+        if pv_move is None or not gs.is_legal(pv_move):
+            pv_move = None
+            follow_pv = False
 
-    ordered_moves = sorted(valid_moves, key=lambda m:gs.move_value(m), reverse=True)
+    # the selective parts stay off at the root, along the previous best line, in check and near mate scores,
+    # and the ones cutting whole nodes also in nodes with an open window
+    in_check = gs.in_check()
+    selective = ply and not follow_pv and not in_check and abs(beta) < BITBASE_WIN
+    static_score = color * evaluation_function(gs) if selective else 0
+    if selective and not pv_node and USE_REVERSE_FUTILITY and depth < len(FUTILITY_MARGINS) and (
+            static_score - REVERSE_FUTILITY_MARGIN * depth >= beta):
+        return static_score - REVERSE_FUTILITY_MARGIN * depth
+    if (selective and not pv_node and USE_NULL_MOVE and null_allowed and depth >= NULL_MOVE_MIN_DEPTH and
+            static_score >= beta and non_pawn_material(gs)):
+        reduced = depth - 1 - NULL_MOVE_REDUCTION - (depth > 6)
+        state = gs.make_null_move()
+        try:
+            score = -negamax(gs, None, reduced, -beta, -beta + 1, -color, ply + 1, False)
+        finally:
+            gs.undo_null_move(state)
+        if score >= beta:
+            if non_pawn_material(gs) >= NULL_VERIFY_MATERIAL:
+                return beta
+            # in a zugzwang prone ending the cutoff only stands if a reduced search without the null move agrees
+            if negamax(gs, None, reduced, beta - 1, beta, color, ply, False) >= beta:
+                return beta
+            pv_lengths[ply] = ply
+    futile = selective and USE_FUTILITY and depth < len(FUTILITY_MARGINS) and (
+        static_score + FUTILITY_MARGINS[depth] <= alpha)
 
-    max_score = -CHECKMATE
-    for move in ordered_moves:
+    if not ply:
+        # every root move gets searched, so the root sorts the whole list it was given
+        def order_score(move):
+            if move == pv_move or move == hash_move:
+                return HASH_MOVE_SCORE + (move == pv_move)
+            if squares[move >> 6 & 63] != EMPTY or move & NOISY_FLAGS:
+                return CAPTURE_SCORE + mvv_lva(squares, move)
+            if move == killer_moves[0]:
+                return KILLER_SCORE
+            if move == killer_moves[1]:
+                return KILLER_SCORE - 1
+            return history[squares[move & 63]][move >> 6 & 63]
+
+        started = timer()
+        moves = sorted(valid_moves, key=order_score, reverse=True)
+        order_time += timer() - started
+    else:
+        moves = pick_moves(gs, (pv_move, hash_move), killer_moves)
+
+    # below any score a move can get, so the first move searched is the best so far even when every move is
+    # mated and the root always has a move
+    max_score = -CHECKMATE - 1
+    best_move = None
+    searched = 0
+    for move in moves:
+        # read before the move is made since the search only sees packed moves
+        quiet = squares[move >> 6 & 63] == EMPTY and not move & NOISY_FLAGS
         gs.make_move(move)
-        next_moves = gs.get_valid_moves()
-        score = -negamax(gs, next_moves, depth - 1, -beta, -alpha, -color, DEPTH)
+        # quiet moves that don't give check are the ones pruned or reduced
+        late_quiet = searched and quiet and selective and move not in killer_moves and not gs.in_check()
+        if late_quiet and futile:
+            gs.undo_move()
+            continue
+        reduction = 0
+        if late_quiet and USE_LMR and depth >= LMR_MIN_DEPTH and searched >= LMR_MOVES:
+            reduction = 2 if searched >= LMR_DEEP_MOVES and depth > 3 else 1
+        if searched and (USE_PVS or reduction):
+            # a zero window only tells if the move beats alpha, one that does is searched again at full depth
+            # and then with the full window
+            score = -negamax(gs, None, depth - 1 - reduction, -alpha - 1, -alpha, -color, ply + 1)
+            if score > alpha and reduction and USE_PVS:
+                score = -negamax(gs, None, depth - 1, -alpha - 1, -alpha, -color, ply + 1)
+            if score > alpha and (not USE_PVS or score < beta and pv_node):
+                score = -negamax(gs, None, depth - 1, -beta, -alpha, -color, ply + 1)
+        else:
+            score = -negamax(gs, None, depth - 1, -beta, -alpha, -color, ply + 1)
+        # only the first move at each node continues the previous best line
+        follow_pv = False
+        searched += 1
 
         if score > max_score:
             max_score = score
-            if depth == DEPTH:
+            best_move = move
+            if not ply:
                 next_move = move
+            # the move and the child's best line become this node's best line
+            if score > alpha:
+                row = pv_table[ply]
+                row[ply] = move
+                length = pv_lengths[ply + 1]
+                row[ply + 1:length] = pv_table[ply + 1][ply + 1:length]
+                pv_lengths[ply] = length
         gs.undo_move()
 
         if max_score > alpha:
             alpha = max_score
         if alpha >= beta:
+            cutoffs += 1
+            if searched == 1:
+                first_move_cutoffs += 1
+            # a quiet move causing a cutoff becomes a killer of this ply and gains history
+            if quiet:
+                update_killers_and_history(squares[move & 63], move, ply, depth)
             break
 
+    # no moves left means checkmate or stalemate
+    if not searched:
+        return -CHECKMATE if in_check else STALEMATE
+    if max_score <= alpha_orig:
+        flag = UPPER_BOUND
+    elif max_score >= beta:
+        flag = LOWER_BOUND
+    else:
+        flag = EXACT
+    tt.store(gs.zobrist, depth, flag, max_score, best_move)
     return max_score
 
 
+# yields the moves of a node stage by stage and only generates a stage once the search gets to it, so a
+# node that cuts off early skips most of the work: the leading moves, which can come from another position
+# and are checked first, captures that don't lose material by mvv-lva, killers, quiet moves by history and
+# last the captures the static exchange evaluation says lose material
+def pick_moves(gs, leading, killer_moves):
+    global movegen_time, order_time
+    squares = gs.squares
+    tried = []
+    for move in leading:
+        if move is not None and move not in tried and gs.is_legal(move):
+            tried.append(move)
+            yield move
+
+    started = timer()
+    captures = gs.get_capture_moves()
+    generated = timer()
+    movegen_time += generated - started
+    captures.sort(key=lambda move: mvv_lva(squares, move), reverse=True)
+    order_time += timer() - generated
+    losing = []
+    for move in captures:
+        if move in tried:
+            continue
+        # taking a piece worth at least the capturer can't lose material
+        if (PIECE_GAIN[squares[move >> 6 & 63]] < PIECE_GAIN[squares[move & 63]] and not move & NOISY_FLAGS and
+                gs.static_exchange(move) < 0):
+            losing.append(move)
+        else:
+            yield move
+
+    for move in killer_moves:
+        if (move is not None and move not in tried and squares[move >> 6 & 63] == EMPTY and
+                not move & NOISY_FLAGS and gs.is_legal(move)):
+            tried.append(move)
+            yield move
+
+    started = timer()
+    quiets = gs.get_quiet_moves()
+    generated = timer()
+    movegen_time += generated - started
+    quiets.sort(key=lambda move: history[squares[move & 63]][move >> 6 & 63], reverse=True)
+    order_time += timer() - generated
+    for move in quiets:
+        if move not in tried:
+            yield move
+    yield from losing
+
+
+# material of the side to move's pieces other than pawns and the king
+def non_pawn_material(gs) -> int:
+    bitboards = gs.bitboards
+    offset = 0 if gs.white_to_move else 6
+    return sum(PIECE_GAIN[piece] * bin(bitboards[piece + offset]).count('1')
+               for piece in (ChessEngine.WN, ChessEngine.WB, ChessEngine.WR, ChessEngine.WQ))
+
+
+# most valuable victim first and among those the least valuable attacker first
+def mvv_lva(squares, move) -> int:
+    victim = PIECE_ORDER[squares[move >> 6 & 63]]
+    if move & NOISY_FLAGS:
+        if move & ChessEngine.MOVE_PROMOTION:
+            victim += PROMOTION_ORDER[move >> 12 & 3]
+        else:
+            victim = PIECE_ORDER[ChessEngine.WP]
+    return victim * 10 - PIECE_ORDER[squares[move & 63]]
+
+
+# remembers a quiet move of the given piece code that caused a beta cutoff
+def update_killers_and_history(piece, move, ply, depth):
+    killer_moves = killers[ply]
+    if killer_moves[0] != move:
+        killer_moves[1] = killer_moves[0]
+        killer_moves[0] = move
+    scores = history[piece]
+    end = move >> 6 & 63
+    scores[end] += depth * depth
+    if scores[end] > HISTORY_LIMIT:
+        for table in history:
+            for sq in range(64):
+                table[sq] //= 2
+
+
+# searches captures and promotions past the horizon until the position is quiet
+def quiescence(gs, alpha, beta, color):
+    global q_nodes, movegen_time, eval_time, order_time
+    q_nodes += 1
+    if q_nodes % CHECK_INTERVAL == 0:
+        check_limits()
+    if bitbases is not None:
+        score = bitbase_score(gs)
+        if score is not None:
+            return score
+    # in check every evasion is searched and standing pat is not allowed
+    in_check = gs.in_check()
+    if in_check:
+        generated = timer()
+        moves = gs.get_valid_moves()
+        started = timer()
+        movegen_time += started - generated
+        if not moves:
+            return -CHECKMATE
+        stand_pat = -CHECKMATE
+    else:
+        # the side to move can usually do at least as well as the static score by not capturing
+        started = timer()
+        stand_pat = color * evaluation_function(gs)
+        if stand_pat >= beta:
+            eval_time += timer() - started
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        # one clock reading ends the evaluation and starts the move generation
+        generated = timer()
+        eval_time += generated - started
+        moves = gs.get_capture_moves()
+        started = timer()
+        movegen_time += started - generated
+
+    max_score = stand_pat
+    squares = gs.squares
+    if len(moves) > 1:
+        moves.sort(key=lambda move: mvv_lva(squares, move), reverse=True)
+        order_time += timer() - started
+    for move in moves:
+        # delta pruning, skip captures that can't bring the score back up to alpha
+        if not in_check and stand_pat + capture_gain(squares, move) + DELTA_MARGIN <= alpha:
+            continue
+        gs.make_move(move)
+        score = -quiescence(gs, -beta, -alpha, -color)
+        gs.undo_move()
+        if score > max_score:
+            max_score = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+    return max_score
+
+
+# score of a position in the endgame tables for the side to move, None if the tables don't cover it,
+# pawn wins without a known distance to mate go up as the pawn advances so the search makes progress
+def bitbase_score(gs):
+    entry = bitbases.probe(gs)
+    if entry is None:
+        return None
+    result, plies = entry
+    if result == ChessBitbase.DRAW:
+        return STALEMATE
+    if plies >= 0:
+        score = BITBASE_MATE - plies
+    else:
+        white_pawns = gs.bitboards[ChessEngine.WP]
+        if white_pawns:
+            advance = 6 - (white_pawns.bit_length() - 1) // 8
+        else:
+            advance = (gs.bitboards[ChessEngine.BP].bit_length() - 1) // 8 - 1
+        score = BITBASE_WIN + 10 * advance
+    return score if result == ChessBitbase.WIN else -score
+
+
+# material won by a capture or promotion, used to order and prune quiescence moves
+def capture_gain(squares, move) -> int:
+    gain = PIECE_GAIN[squares[move >> 6 & 63]]
+    if move & NOISY_FLAGS:
+        if move & ChessEngine.MOVE_PROMOTION:
+            gain += PROMOTION_GAIN[move >> 12 & 3]
+        else:
+            gain = piece_points['p']
+    return gain
+
+
 def evaluate_board(board):
     points = 0
     for row in board:
@@ -96,75 +746,6 @@ def evaluate_board(board):
 
 
 def evaluation_function(gs):
-    piece_tables = {
-        'p': [
-            [0, 0, 0, 0, 0, 0, 0, 0],
-            [5, 5, 5, 5, 5, 5, 5, 5],
-            [1, 1, 2, 3, 3, 2, 1, 1],
-            [0, 0, 0, 2, 2, 0, 0, 0],
-            [0, 0, 0, 1, 1, 0, 0, 0],
-            [1, -1, -1, 0, 0, -1, -1, 1],
-            [1, 2, 2, -2, -2, 2, 2, 1],
-            [0, 0, 0, 0, 0, 0, 0, 0]
-        ],
-
-        'R': [
-            [0, 0, 0, 0, 0, 0, 0, 0],
-            [0.5, 1, 1, 1, 1, 1, 1, 0.5],
-            [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
-            [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
-            [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
-            [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
-            [0.5, 1, 1, 1, 1, 1, 1, 0.5],
-            [0, 0, 0, 0, 0, 0, 0, 0]
-        ],
-
-        'N': [
-            [-5, -4, -3, -3, -3, -3, -4, -5],
-            [-4, -2, 0, 0, 0, 0, -2, -4],
-            [-3, 0, 1, 1.5, 1.5, 1, 0, -3],
-            [-3, 0.5, 1.5, 2, 2, 1.5, 0.5, -3],
-            [-3, 0, 1.5, 2, 2, 1.5, 0, -3],
-            [-3, 0.5, 1, 1.5, 1.5, 1, 0.5, -3],
-            [-4, -2, 0, 0.5, 0.5, 0, -2, -4],
-            [-5, -4, -3, -3, -3, -3, -4, -5]
-        ],
-
-        'B': [
-            [-2, -1, -1, -1, -1, -1, -1, -2],
-            [-1, 0, 0, 0, 0, 0, 0, -1],
-            [-1, 0, 0.5, 1, 1, 0.5, 0, -1],
-            [-1, 0.5, 0.5, 1, 1, 0.5, 0.5, -1],
-            [-1, 0, 1, 1, 1, 1, 0, -1],
-            [-1, 1, 1, 1, 1, 1, 1, -1],
-            [-1, 0.5, 0, 0, 0, 0, 0.5, -1],
-            [-2, -1, -1, -1, -1, -1, -1, -2]
-        ],
-
-        'Q': [
-            [-2, -1, -1, -0.5, -0.5, -1, -1, -2],
-            [-1, 0, 0, 0, 0, 0, 0, -1],
-            [-1, 0, 0.5, 0.5, 0.5, 0.5, 0, -1],
-            [-0.5, 0, 0.5, 0.5, 0.5, 0.5, 0, -0.5],
-            [0, 0, 0.5, 0.5, 0.5, 0.5, 0, -0.5],
-            [-1, 0.5, 0.5, 0.5, 0.5, 0.5, 0, -1],
-            [-1, 0, 0.5, 0, 0, 0, 0, -1],
-            [-2, -1, -1, -0.5, -0.5, -1, -1, -2]
-        ],
-
-        'K': [
-            [-3, -4, -4, -5, -5, -4, -4, -3],
-            [-3, -4, -4, -5, -5, -4, -4, -3],
-            [-3, -4, -4, -5, -5, -4, -4, -3],
-            [-3, -4, -4, -5, -5, -4, -4, -3],
-            [-2, -3, -3, -4, -4, -3, -3, -2],
-            [-1, -2, -2, -2, -2, -2, -2, -1],
-            [2, 2, 0, 0, 0, 0, 2, 2],
-            [2, 3, 1, 0, 0, 1, 3, 2]
-        ],
-
-    }
-
     if gs.checkmate:
         if gs.white_to_move:
             return -CHECKMATE
@@ -173,25 +754,4 @@ def evaluation_function(gs):
     elif gs.stalemate:
         return STALEMATE
     else:
-        points = 0
-        for row in range(8):
-            for col in range(8):
-                square = gs.board[row][col]
-                if square[0] == 'w':
-                    points += piece_points[square[1]]
-                elif square[0] == 'b':
-                    points -= piece_points[square[1]]
-                if square[1] == '-':
-                    positional_pts = 0
-                else:
-                    if square[0] == 'w':
-                        table = piece_tables[square[1]]
-                        positional_pts = table[row][col] * 10
-                    else:
-                        table = piece_tables[square[1]]
-                        positional_pts = table[7 - row][col] * 10
-                if square[0] == 'w':
-                    points += positional_pts
-                elif square[0] == 'b':
-                    points -= positional_pts
-        return points
+        return gs.material + gs.positional
@@ -0,0 +1,65 @@
+import numpy as np
+from Chess import ChessEngine
+
+# boards are encoded as 64 int8 piece codes in square order, ChessEngine.EMPTY for a free square, so the
+# material and positional value of a square is one lookup in this (13, 64) table, the empty row is all zeros
+SQUARE_VALUES = np.array([[material + value for value in values] for material, values in
+                          zip(ChessEngine.PIECE_VALUES, ChessEngine.PIECE_SQUARE_VALUES)] + [[0] * 64], dtype=np.int32)
+# offset of every square's row in the flattened table, added to the piece code times 64
+SQUARE_OFFSETS = np.arange(64, dtype=np.intp)
+PROMOTION_OFFSETS = np.array(ChessEngine.PROMOTION_OFFSETS, dtype=np.int8)
+
+
+# encodes the board of a game state as a (64,) int8 array
+def encode_board(gs) -> np.ndarray:
+    return np.array(gs.squares, dtype=np.int8)
+
+
+# encodes the boards of many game states or fens as an (N, 64) int8 array
+def encode_boards(positions) -> np.ndarray:
+    positions = list(positions)
+    boards = np.empty((len(positions), 64), dtype=np.int8)
+    for i, position in enumerate(positions):
+        if isinstance(position, str):
+            position = ChessEngine.GameState(position)
+        boards[i] = position.squares
+    return boards
+
+
+# scores an (N, 64) array of encoded boards from white's point of view, the same material plus positional
+# score evaluation_function gives a position that is not checkmate or stalemate, which need move generation
+def evaluate_batch(boards) -> np.ndarray:
+    boards = np.asarray(boards)
+    indices = boards.astype(np.intp) * 64 + SQUARE_OFFSETS
+    return SQUARE_VALUES.ravel()[indices].sum(axis=1, dtype=np.int64)
+
+
+# encodes the boards after each of the valid moves without playing them, for scoring all the children of a
+# node in one call
+def encode_children(gs, moves) -> np.ndarray:
+    moves = np.asarray(moves, dtype=np.int32)
+    parent = encode_board(gs)
+    boards = np.repeat(parent[np.newaxis], len(moves), axis=0)
+    rows = np.arange(len(moves))
+    starts, ends, flags = moves & 63, moves >> 6 & 63, moves >> 12
+    pieces = parent[starts]
+    promotions = (flags & 4) != 0
+    pieces[promotions] += PROMOTION_OFFSETS[flags[promotions] & 3]
+    boards[rows, starts] = ChessEngine.EMPTY
+    boards[rows, ends] = pieces
+    # an enpassant capture takes the pawn next to the start square, on the end square's column
+    enpassant = flags == 1
+    boards[rows[enpassant], (starts[enpassant] & ~7) | (ends[enpassant] & 7)] = ChessEngine.EMPTY
+    # castling moves the rook from the corner to the square the king passed over
+    castles = rows[flags == 2]
+    king_side = ends[castles] > starts[castles]
+    rook_starts = np.where(king_side, ends[castles] + 1, ends[castles] - 2)
+    rook_ends = np.where(king_side, ends[castles] - 1, ends[castles] + 1)
+    boards[castles, rook_ends] = parent[rook_starts]
+    boards[castles, rook_starts] = ChessEngine.EMPTY
+    return boards
+
+
+# scores the position after each of the moves in one batch, from white's point of view
+def evaluate_children(gs, moves) -> np.ndarray:
+    return evaluate_batch(encode_children(gs, moves))
@@ -0,0 +1,255 @@
+import argparse
+import mmap
+import os
+import time
+from Chess import ChessEngine
+from Chess.ChessEngine import KING_ATTACKS, PAWN_ATTACKS, WHITE, WP, WR, WQ, BP
+
+# every table covers the strong side's king and piece against a lone king, with the strong side always
+# stored as white, positions are indexed as side to move << 18 | strong king << 12 | weak king << 6 | piece
+TABLE_SIZE = 2 * 64 * 64 * 64
+STRONG_TO_MOVE, WEAK_TO_MOVE = 0, 1
+# file name of each table by the strong piece, the pawn table only stores win or draw as one bit per position
+# and the others store the distance to mate in plies plus one as a byte per position, 0 for a draw
+TABLE_FILES = {WQ: 'kqk.bin', WR: 'krk.bin', WP: 'kpk.bin'}
+# probe results from the point of view of the side to move
+WIN, DRAW, LOSS = 1, 0, -1
+
+
+# index of a position in a table
+def table_index(to_move, strong_king, weak_king, piece) -> int:
+    return to_move << 18 | strong_king << 12 | weak_king << 6 | piece
+
+
+# squares the strong piece attacks with the given occupancy
+def piece_attacks(piece, sq, occupied) -> int:
+    if piece == WP:
+        return PAWN_ATTACKS[WHITE][sq]
+    if piece == WR:
+        return ChessEngine.rook_attacks(sq, occupied)
+    return ChessEngine.rook_attacks(sq, occupied) | ChessEngine.bishop_attacks(sq, occupied)
+
+
+# checks that the pieces stand on different squares, the kings aren't touching, a pawn isn't on the first
+# or last rank and the side that just moved isn't in check
+def is_legal(piece, to_move, strong_king, weak_king, sq) -> bool:
+    if strong_king == weak_king or sq == strong_king or sq == weak_king:
+        return False
+    if KING_ATTACKS[strong_king] >> weak_king & 1:
+        return False
+    if piece == WP and (sq < 8 or sq >= 56):
+        return False
+    if to_move == STRONG_TO_MOVE:
+        occupied = 1 << strong_king | 1 << weak_king | 1 << sq
+        return not piece_attacks(piece, sq, occupied) >> weak_king & 1
+    return True
+
+
+# counts the lone king's legal moves, a capture of the undefended piece makes the position a draw so it
+# returns None then, the second value tells if the lone king is in check
+def weak_moves(piece, strong_king, weak_king, sq) -> tuple:
+    occupied = 1 << strong_king | 1 << sq
+    attacked = KING_ATTACKS[strong_king] | piece_attacks(piece, sq, occupied)
+    in_check = bool(attacked >> weak_king & 1)
+    count = 0
+    targets = KING_ATTACKS[weak_king] & ~KING_ATTACKS[strong_king]
+    while targets:
+        bit = targets & -targets
+        targets ^= bit
+        if bit == 1 << sq:
+            return None, in_check
+        if not attacked & bit:
+            count += 1
+    return count, in_check
+
+
+# positions one strong move back from a position with the lone king to move
+def strong_predecessors(piece, strong_king, weak_king, sq) -> list:
+    predecessors = []
+    occupied = 1 << strong_king | 1 << weak_king | 1 << sq
+    empty = ChessEngine.FULL ^ occupied
+    targets = KING_ATTACKS[strong_king] & empty
+    while targets:
+        bit = targets & -targets
+        targets ^= bit
+        king = bit.bit_length() - 1
+        if is_legal(piece, STRONG_TO_MOVE, king, weak_king, sq):
+            predecessors.append(table_index(STRONG_TO_MOVE, king, weak_king, sq))
+    if piece == WP:
+        # a pawn comes from one row below, or two from its starting row
+        targets = 0
+        if sq + 8 < 56 and empty >> (sq + 8) & 1:
+            targets = 1 << (sq + 8)
+            if 32 <= sq < 40 and empty >> (sq + 16) & 1:
+                targets |= 1 << (sq + 16)
+    else:
+        targets = piece_attacks(piece, sq, occupied) & empty
+    while targets:
+        bit = targets & -targets
+        targets ^= bit
+        start = bit.bit_length() - 1
+        if is_legal(piece, STRONG_TO_MOVE, strong_king, weak_king, start):
+            predecessors.append(table_index(STRONG_TO_MOVE, strong_king, weak_king, start))
+    return predecessors
+
+
+# positions one lone king move back from a position with the strong side to move
+def weak_predecessors(piece, strong_king, weak_king, sq) -> list:
+    predecessors = []
+    targets = KING_ATTACKS[weak_king] & ~KING_ATTACKS[strong_king] & ~(1 << strong_king | 1 << sq)
+    while targets:
+        bit = targets & -targets
+        targets ^= bit
+        predecessors.append(table_index(WEAK_TO_MOVE, strong_king, bit.bit_length() - 1, sq))
+    return predecessors
+
+
+# plies to mate plus one after every pawn promotion of the positions, looked up in the finished queen and
+# rook tables, as {index: plies + 1} for the positions where promoting wins
+def promotion_wins(tables) -> dict:
+    wins = {}
+    for strong_king in range(64):
+        for weak_king in range(64):
+            for sq in range(8, 16):
+                if not is_legal(WP, STRONG_TO_MOVE, strong_king, weak_king, sq):
+                    continue
+                end = sq - 8
+                if end == strong_king or end == weak_king:
+                    continue
+                best = 0
+                for piece in (WQ, WR):
+                    plies = tables[piece][table_index(WEAK_TO_MOVE, strong_king, weak_king, end)]
+                    if plies and (not best or plies + 1 < best):
+                        best = plies + 1
+                if best:
+                    wins[table_index(STRONG_TO_MOVE, strong_king, weak_king, sq)] = best
+    return wins
+
+
+# retrograde analysis of one table, returns the distance to mate in plies plus one of every position
+# won by the strong side and 0 for draws and illegal positions, promotions are looked up in tables
+def generate_table(piece, tables=None) -> bytearray:
+    plies = bytearray(TABLE_SIZE)
+    # lone king moves not yet known to lose, the position is lost once this reaches 0
+    remaining = [0] * TABLE_SIZE
+    levels = [[] for i in range(256)]
+    for strong_king in range(64):
+        for weak_king in range(64):
+            for sq in range(64):
+                if not is_legal(piece, WEAK_TO_MOVE, strong_king, weak_king, sq):
+                    continue
+                count, in_check = weak_moves(piece, strong_king, weak_king, sq)
+                index = table_index(WEAK_TO_MOVE, strong_king, weak_king, sq)
+                # a capture can never lose, so those positions keep a count that never runs out
+                remaining[index] = count if count is not None else -1
+                if count == 0 and in_check:
+                    levels[0].append(index)
+    if piece == WP:
+        for index, distance in promotion_wins(tables).items():
+            levels[distance - 1].append(index)
+    # positions are settled in order of their distance to mate, so a lost position takes the distance of
+    # the last of its moves to be settled, which is its longest way to be mated
+    for level in range(255):
+        for index in levels[level]:
+            if plies[index]:
+                continue
+            plies[index] = level + 1
+            to_move, strong_king, weak_king, sq = index >> 18, index >> 12 & 63, index >> 6 & 63, index & 63
+            if to_move == WEAK_TO_MOVE:
+                levels[level + 1].extend(strong_predecessors(piece, strong_king, weak_king, sq))
+            else:
+                for predecessor in weak_predecessors(piece, strong_king, weak_king, sq):
+                    remaining[predecessor] -= 1
+                    if remaining[predecessor] == 0:
+                        levels[level + 1].append(predecessor)
+    return plies
+
+
+# packs a table into one bit per position, set for positions won by the strong side
+def pack_bits(plies) -> bytearray:
+    bits = bytearray(len(plies) // 8)
+    for index, value in enumerate(plies):
+        if value:
+            bits[index >> 3] |= 1 << (index & 7)
+    return bits
+
+
+# generates every table and writes it to the directory, the queen and rook tables come first since
+# pawn promotions are looked up in them
+def generate_all(directory, output=print):
+    os.makedirs(directory, exist_ok=True)
+    tables = {}
+    for piece in (WQ, WR, WP):
+        start = time.perf_counter()
+        tables[piece] = generate_table(piece, tables)
+        data = pack_bits(tables[piece]) if piece == WP else tables[piece]
+        with open(os.path.join(directory, TABLE_FILES[piece]), 'wb') as file:
+            file.write(data)
+        won = sum(1 for value in tables[piece] if value)
+        longest = max(tables[piece]) - 1
+        output(f'{TABLE_FILES[piece]}: {won} won positions, longest mate {longest} plies, '
+               f'{time.perf_counter() - start:.1f}s')
+
+
+# the generated tables memory mapped from a directory, probes are a few lookups and one read
+class Bitbases:
+    def __init__(self, directory):
+        self.files = []
+        # mapped table data by the strong piece code
+        self.tables = {}
+        for piece, name in TABLE_FILES.items():
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                file = open(path, 'rb')
+                self.files.append(file)
+                self.tables[piece] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # looks up a king and piece against king position as (result, plies to mate) for the side to move,
+    # plies is -1 when only the result is known, None if the position is not in the tables
+    def probe(self, gs):
+        # exactly three pieces means the two kings and one more
+        occupied = gs.occupied
+        occupied &= occupied - 1
+        occupied &= occupied - 1
+        if not occupied or occupied & (occupied - 1):
+            return None
+        sq = (gs.occupied ^ gs.bitboards[ChessEngine.WK] ^ gs.bitboards[ChessEngine.BK]).bit_length() - 1
+        piece = gs.squares[sq]
+        strong_to_move = gs.white_to_move
+        if piece >= BP:
+            # black is the strong side, so the board is flipped top to bottom to store it as white
+            piece -= BP - WP
+            strong_king, weak_king, sq = gs.king_squares[1] ^ 56, gs.king_squares[0] ^ 56, sq ^ 56
+            strong_to_move = not strong_to_move
+        else:
+            strong_king, weak_king = gs.king_squares[0], gs.king_squares[1]
+        table = self.tables.get(piece)
+        if table is None:
+            return None
+        index = table_index(STRONG_TO_MOVE if strong_to_move else WEAK_TO_MOVE, strong_king, weak_king, sq)
+        if piece == WP:
+            if not table[index >> 3] >> (index & 7) & 1:
+                return DRAW, 0
+            return (WIN if strong_to_move else LOSS), -1
+        plies = table[index]
+        if not plies:
+            return DRAW, 0
+        return (WIN if strong_to_move else LOSS), plies - 1
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for file in self.files:
+            file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate the king and pawn, rook or queen against king tables.')
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bitbases'),
+                        help='directory to write the tables to')
+    args = parser.parse_args()
+    generate_all(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,174 +1,798 @@
-import numpy as np
-
+import random
+import struct
 
 piece_points = {'K': 20000, 'Q': 900, 'R': 500, 'N': 330, 'B': 330, 'p': 100}
+
+# piece codes used to index the bitboards, EMPTY marks a free square in the square lookup
+WP, WN, WB, WR, WQ, WK, BP, BN, BB, BR, BQ, BK = range(12)
+EMPTY = 12
+PIECE_NAMES = ('wp', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bp', 'bN', 'bB', 'bR', 'bQ', 'bK', '--')
+PIECE_INDEX = {name: i for i, name in enumerate(PIECE_NAMES)}
+WHITE, BLACK = 0, 1
+
+# squares are numbered row * 8 + col so a8 is 0 and h1 is 63, bit n of a bitboard is square n
+FULL = 0xFFFFFFFFFFFFFFFF
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+RANK_3 = 0xFF << 40
+RANK_6 = 0xFF << 16
+# rows 0 and 7 where pawns promote
+PROMOTION_RANKS = 0xFF | 0xFF << 56
+
+# positional tables from white's point of view in tenths of a pawn, row 0 is the eighth rank
+piece_tables = {
+    'p': [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [5, 5, 5, 5, 5, 5, 5, 5],
+        [1, 1, 2, 3, 3, 2, 1, 1],
+        [0, 0, 0, 2, 2, 0, 0, 0],
+        [0, 0, 0, 1, 1, 0, 0, 0],
+        [1, -1, -1, 0, 0, -1, -1, 1],
+        [1, 2, 2, -2, -2, 2, 2, 1],
+        [0, 0, 0, 0, 0, 0, 0, 0]
+    ],
+
+    'R': [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [0.5, 1, 1, 1, 1, 1, 1, 0.5],
+        [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
+        [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
+        [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
+        [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
+        [0.5, 1, 1, 1, 1, 1, 1, 0.5],
+        [0, 0, 0, 0, 0, 0, 0, 0]
+    ],
+
+    'N': [
+        [-5, -4, -3, -3, -3, -3, -4, -5],
+        [-4, -2, 0, 0, 0, 0, -2, -4],
+        [-3, 0, 1, 1.5, 1.5, 1, 0, -3],
+        [-3, 0.5, 1.5, 2, 2, 1.5, 0.5, -3],
+        [-3, 0, 1.5, 2, 2, 1.5, 0, -3],
+        [-3, 0.5, 1, 1.5, 1.5, 1, 0.5, -3],
+        [-4, -2, 0, 0.5, 0.5, 0, -2, -4],
+        [-5, -4, -3, -3, -3, -3, -4, -5]
+    ],
+
+    'B': [
+        [-2, -1, -1, -1, -1, -1, -1, -2],
+        [-1, 0, 0, 0, 0, 0, 0, -1],
+        [-1, 0, 0.5, 1, 1, 0.5, 0, -1],
+        [-1, 0.5, 0.5, 1, 1, 0.5, 0.5, -1],
+        [-1, 0, 1, 1, 1, 1, 0, -1],
+        [-1, 1, 1, 1, 1, 1, 1, -1],
+        [-1, 0.5, 0, 0, 0, 0, 0.5, -1],
+        [-2, -1, -1, -1, -1, -1, -1, -2]
+    ],
+
+    'Q': [
+        [-2, -1, -1, -0.5, -0.5, -1, -1, -2],
+        [-1, 0, 0, 0, 0, 0, 0, -1],
+        [-1, 0, 0.5, 0.5, 0.5, 0.5, 0, -1],
+        [-0.5, 0, 0.5, 0.5, 0.5, 0.5, 0, -0.5],
+        [0, 0, 0.5, 0.5, 0.5, 0.5, 0, -0.5],
+        [-1, 0.5, 0.5, 0.5, 0.5, 0.5, 0, -1],
+        [-1, 0, 0.5, 0, 0, 0, 0, -1],
+        [-2, -1, -1, -0.5, -0.5, -1, -1, -2]
+    ],
+
+    'K': [
+        [-3, -4, -4, -5, -5, -4, -4, -3],
+        [-3, -4, -4, -5, -5, -4, -4, -3],
+        [-3, -4, -4, -5, -5, -4, -4, -3],
+        [-3, -4, -4, -5, -5, -4, -4, -3],
+        [-2, -3, -3, -4, -4, -3, -3, -2],
+        [-1, -2, -2, -2, -2, -2, -2, -1],
+        [2, 2, 0, 0, 0, 0, 2, 2],
+        [2, 3, 1, 0, 0, 1, 3, 2]
+    ]
+}
+
+# material and positional value of every piece code on every square, black values mirrored and negated
+PIECE_VALUES = [piece_points[name[1]] if name[0] == 'w' else -piece_points[name[1]] for name in PIECE_NAMES[:12]]
+PIECE_SQUARE_VALUES = [[int(piece_tables[name[1]][sq // 8][sq % 8] * 10) if name[0] == 'w' else
+                        -int(piece_tables[name[1]][7 - sq // 8][sq % 8] * 10) for sq in range(64)]
+                       for name in PIECE_NAMES[:12]]
+
+# piece letters used by fen strings, in piece code order
+FEN_PIECES = 'PNBRQKpnbrqk'
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+# promotion piece letters, the queen first since the gui always promotes to a queen
+PROMOTION_PIECES = ('Q', 'R', 'B', 'N')
+PROMOTION_OFFSETS = (WQ - WP, WR - WP, WB - WP, WN - WP)
+
+# moves are packed into one int: start square in bits 0-5, end square in bits 6-11 and a flag in bits 12-15,
+# the piece captured is not part of the move, make_move records it on the undo log instead
+MOVE_ENPASSANT = 1 << 12
+MOVE_CASTLE = 2 << 12
+# promotions set bit 14 and keep the index of the new piece in PROMOTION_PIECES in bits 12-13
+MOVE_PROMOTION = 4 << 12
+PROMOTION_FLAGS = tuple(MOVE_PROMOTION | i << 12 for i in range(len(PROMOTION_PIECES)))
+SQUARE_NAMES = ['abcdefgh'[sq % 8] + str(8 - sq // 8) for sq in range(64)]
+
+# castling rights packed into 4 bits, which also index the zobrist castling keys
+WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE = 1, 2, 4, 8
+CASTLING_LETTERS = {'K': WHITE_KING_SIDE, 'Q': WHITE_QUEEN_SIDE, 'k': BLACK_KING_SIDE, 'q': BLACK_QUEEN_SIDE}
+# king and rook a castling right needs on their home squares as (king, king square, rook, rook square)
+CASTLING_HOMES = {WHITE_KING_SIDE: (WK, 60, WR, 63), WHITE_QUEEN_SIDE: (WK, 60, WR, 56),
+                  BLACK_KING_SIDE: (BK, 4, BR, 7), BLACK_QUEEN_SIDE: (BK, 4, BR, 0)}
+# rights kept by a move starting or ending on a square, a king or rook leaving home or a rook being taken loses them
+CASTLE_MASKS = [15] * 64
+CASTLE_MASKS[60] = 15 ^ (WHITE_KING_SIDE | WHITE_QUEEN_SIDE)
+CASTLE_MASKS[63] = 15 ^ WHITE_KING_SIDE
+CASTLE_MASKS[56] = 15 ^ WHITE_QUEEN_SIDE
+CASTLE_MASKS[4] = 15 ^ (BLACK_KING_SIDE | BLACK_QUEEN_SIDE)
+CASTLE_MASKS[7] = 15 ^ BLACK_KING_SIDE
+CASTLE_MASKS[0] = 15 ^ BLACK_QUEEN_SIDE
+
+# the undo stack keeps UNDO_FIELDS slots per ply: the move, the piece it captured, and the enpassant square,
+# castling rights, zobrist hash and halfmove clock from before it, room for UNDO_CAPACITY plies is made up front
+UNDO_FIELDS = 6
+UNDO_CAPACITY = 1024
+
+# kinds of moves generate_moves produces: captures with promotions, the other moves, or both
+GEN_CAPTURES, GEN_QUIETS, GEN_ALL = 1, 2, 3
+# piece values by code for the static exchange evaluation, the empty square is worth nothing
+EXCHANGE_VALUES = [abs(value) for value in PIECE_VALUES] + [0]
+
+# fixed size binary position: the squares as 4 bit piece codes two to a byte, the castling rights with
+# bit 4 set when black is to move, the enpassant square or -1, the halfmove clock and the fullmove number
+SNAPSHOT = struct.Struct('<32sBbBH')
+
+
+# gets a packed move in long algebraic notation as used by uci, like e2e4 or e7e8q
+def move_to_uci(move) -> str:
+    uci = SQUARE_NAMES[move & 63] + SQUARE_NAMES[move >> 6 & 63]
+    if move & MOVE_PROMOTION:
+        uci += PROMOTION_PIECES[move >> 12 & 3].lower()
+    return uci
+
+
+# builds an attack table for pieces that jump by fixed offsets
+def leaper_attacks(offsets) -> list:
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        attacks = 0
+        for d_row, d_col in offsets:
+            if 0 <= row + d_row < 8 and 0 <= col + d_col < 8:
+                attacks |= 1 << ((row + d_row) * 8 + col + d_col)
+        table.append(attacks)
+    return table
+
+
+# builds the squares seen from every square in one direction on an empty board
+def ray_attacks(d_row, d_col) -> list:
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        ray = 0
+        row, col = row + d_row, col + d_col
+        while 0 <= row < 8 and 0 <= col < 8:
+            ray |= 1 << (row * 8 + col)
+            row, col = row + d_row, col + d_col
+        table.append(ray)
+    return table
+
+
+KNIGHT_ATTACKS = leaper_attacks(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = leaper_attacks(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+# squares attacked by a pawn of each colour standing on a square
+PAWN_ATTACKS = [leaper_attacks(((-1, -1), (-1, 1))), leaper_attacks(((1, -1), (1, 1)))]
+# rays going towards higher square numbers stop at their lowest blocker, the others at their highest
+NORTH, SOUTH, EAST, WEST = ray_attacks(-1, 0), ray_attacks(1, 0), ray_attacks(0, 1), ray_attacks(0, -1)
+NORTH_EAST, NORTH_WEST = ray_attacks(-1, 1), ray_attacks(-1, -1)
+SOUTH_EAST, SOUTH_WEST = ray_attacks(1, 1), ray_attacks(1, -1)
+ROOK_RAYS = [NORTH[sq] | SOUTH[sq] | EAST[sq] | WEST[sq] for sq in range(64)]
+BISHOP_RAYS = [NORTH_EAST[sq] | NORTH_WEST[sq] | SOUTH_EAST[sq] | SOUTH_WEST[sq] for sq in range(64)]
+
+
+# builds the squares strictly between two aligned squares and the full line through them
+def line_tables() -> tuple:
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for rays, opposite in ((NORTH, SOUTH), (SOUTH, NORTH), (EAST, WEST), (WEST, EAST),
+                           (NORTH_EAST, SOUTH_WEST), (SOUTH_WEST, NORTH_EAST),
+                           (NORTH_WEST, SOUTH_EAST), (SOUTH_EAST, NORTH_WEST)):
+        for sq in range(64):
+            targets = rays[sq]
+            while targets:
+                bit = targets & -targets
+                targets ^= bit
+                target = bit.bit_length() - 1
+                between[sq][target] = rays[sq] & ~rays[target] & ~bit
+                line[sq][target] = rays[sq] | opposite[sq] | (1 << sq)
+    return between, line
+
+
+BETWEEN, LINE = line_tables()
+
+# random keys xored together into the 64 bit zobrist hash of a position, seeded so every process agrees
+zobrist_random = random.Random(20240601)
+ZOBRIST_PIECES = [[zobrist_random.getrandbits(64) for sq in range(64)] for piece in range(12)]
+ZOBRIST_BLACK_TO_MOVE = zobrist_random.getrandbits(64)
+# indexed by the packed castling rights and by the enpassant file
+ZOBRIST_CASTLING = [zobrist_random.getrandbits(64) for rights in range(16)]
+ZOBRIST_ENPASSANT = [zobrist_random.getrandbits(64) for col in range(8)]
+
+
+# splits an epd line into a fen and its operations as {opcode: [operands]}, like {'bm': ['Qd1+'], 'id': ['BK.01']},
+# the fen's halfmove clock and fullmove number come from the hmvc and fmvn operations when they are given
+def parse_epd(line) -> tuple:
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError('epd needs at least 4 fields: ' + line)
+    operations = {}
+    tokens = []
+    token = ''
+    quoted = False
+    # operations end with a semicolon and their operands are split on spaces outside double quotes
+    for char in (fields[4] if len(fields) > 4 else '') + ';':
+        if quoted:
+            if char == '"':
+                quoted = False
+                tokens.append(token)
+                token = ''
+            else:
+                token += char
+        elif char == '"':
+            quoted = True
+        elif char == ';' or char.isspace():
+            if token:
+                tokens.append(token)
+                token = ''
+            if char == ';' and tokens:
+                operations[tokens[0]] = tokens[1:]
+                tokens = []
+        else:
+            token += char
+    if quoted:
+        raise ValueError('unterminated string in epd: ' + line)
+    halfmove = operations.get('hmvc', ['0'])[0]
+    fullmove = operations.get('fmvn', ['1'])[0]
+    return ' '.join(fields[:4] + [halfmove, fullmove]), operations
+
+
+# sliding attacks along ranks and files for the given occupancy
+def rook_attacks(sq, occupied) -> int:
+    attacks = NORTH[sq]
+    blockers = attacks & occupied
+    if blockers:
+        attacks ^= NORTH[blockers.bit_length() - 1]
+    ray = SOUTH[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= SOUTH[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = EAST[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= EAST[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = WEST[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= WEST[blockers.bit_length() - 1]
+    return attacks | ray
+
+
+# sliding attacks along diagonals for the given occupancy
+def bishop_attacks(sq, occupied) -> int:
+    attacks = NORTH_EAST[sq]
+    blockers = attacks & occupied
+    if blockers:
+        attacks ^= NORTH_EAST[blockers.bit_length() - 1]
+    ray = NORTH_WEST[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= NORTH_WEST[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = SOUTH_EAST[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= SOUTH_EAST[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = SOUTH_WEST[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= SOUTH_WEST[(blockers & -blockers).bit_length() - 1]
+    return attacks | ray
+
+
 # creates GameState object
 class GameState:
-    def __init__(self):
-        # initial board
-        self.board = np.array([
-            ['bR', 'bN', 'bB', 'bQ', 'bK', 'bB', 'bN', 'bR'],
-            ['bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp'],
-            ['--', '--', '--', '--', '--', '--', '--', '--'],
-            ['--', '--', '--', '--', '--', '--', '--', '--'],
-            ['--', '--', '--', '--', '--', '--', '--', '--'],
-            ['--', '--', '--', '--', '--', '--', '--', '--'],
-            ['wp', 'wp', 'wp', 'wp', 'wp', 'wp', 'wp', 'wp'],
-            ['wR', 'wN', 'wB', 'wQ', 'wK', 'wB', 'wN', 'wR']
-        ])
+    def __init__(self, fen=START_FEN):
+        # preallocated undo stack, the move log is read from it
+        self.undo_stack = [0] * (UNDO_CAPACITY * UNDO_FIELDS)
+        self.set_fen(fen)
+
+    # builds a game from a position written by write_snapshot
+    @classmethod
+    def from_snapshot(cls, buffer, offset=0):
+        gs = cls.__new__(cls)
+        gs.undo_stack = [0] * (UNDO_CAPACITY * UNDO_FIELDS)
+        gs.read_snapshot(buffer, offset)
+        return gs
+
+    # empties the board and forgets the moves played helps set_fen and read_snapshot
+    def clear(self):
+        # one bitboard per piece code and a square to piece lookup for captures
+        self.bitboards = [0] * 12
+        self.squares = [EMPTY] * 64
+        # occupancy masks for each colour and for the whole board
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        # king squares indexed by colour
+        self.king_squares = [0, 0]
+        # zobrist hash of the position, kept up to date by every board change
+        self.zobrist = 0
+        # running material and positional scores, white minus black
+        self.material = 0
+        self.positional = 0
         # current turn
         self.white_to_move = True
-        # list of all moves played
-        self.move_log = []
-        self.move_funcs = {'p': self.pawn_moves, 'R': self.rook_moves, 'N': self.knight_moves,
-                           'B': self.bishop_moves, 'Q': self.queen_moves, 'K': self.king_moves}
-        # king locations
-        self.white_king = (7, 4)
-        self.black_king = (0, 4)
+        # number of moves played, the undo stack holds what is needed to take them back
+        self.ply = 0
+        # moves since the last capture or pawn move
+        self.halfmove_clock = 0
+        # plies played before the start position, taken from the fullmove number
+        self.start_ply = 0
         # checkmate, stalemate, and resign
         self.checkmate = False
         self.stalemate = False
         self.resign = False
-        # square where enpassant is possible
-        self.enpassant_possible = ()
-        self.enpassant_possible_log = [self.enpassant_possible]
-        # current castling rights and log of castle rights
-        self.current_castle_rights = CastleRights(True, True, True, True)
-        self.castle_rights_log = [CastleRights(self.current_castle_rights.wks, self.current_castle_rights.bks,
-                                               self.current_castle_rights.wqs, self.current_castle_rights.bqs)]
+        # square where enpassant is possible, -1 if there is none
+        self.enpassant_square = -1
+        # current castling rights as WHITE_KING_SIDE | WHITE_QUEEN_SIDE | ... bits
+        self.castle_rights = 0
+
+    # replaces the game with the position from a fen string
+    def set_fen(self, fen):
+        self.clear()
+        self.load_fen(fen)
+        self.zobrist = self.compute_zobrist()
+        # initial board, kept so the game can be sent to other processes as the fen and its moves
+        self.start_fen = fen
+
+    # sets up pieces, turn, castling rights, enpassant square and move counters from a fen string helps set_fen
+    def load_fen(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError('fen needs at least 4 fields: ' + fen)
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError('fen board needs 8 rows: ' + fen)
+        for row, text in enumerate(rows):
+            col = 0
+            for char in text:
+                if char.isdigit():
+                    col += int(char)
+                elif char in FEN_PIECES and col < 8:
+                    self.put_piece(FEN_PIECES.index(char), row * 8 + col)
+                    col += 1
+                else:
+                    raise ValueError('bad fen board: ' + fen)
+            if col != 8:
+                raise ValueError('fen row needs 8 squares: ' + fen)
+        if self.bitboards[WK] == 0 or self.bitboards[BK] == 0:
+            raise ValueError('fen needs both kings: ' + fen)
+        if fields[1] not in ('w', 'b'):
+            raise ValueError('bad fen turn: ' + fen)
+        self.white_to_move = fields[1] == 'w'
+        rights = 0
+        for char in fields[2]:
+            rights |= CASTLING_LETTERS.get(char, 0)
+        self.castle_rights = self.usable_castle_rights(rights)
+        if fields[3] != '-':
+            if fields[3] not in SQUARE_NAMES or not self.is_enpassant_possible(SQUARE_NAMES.index(fields[3])):
+                raise ValueError('bad fen enpassant square: ' + fen)
+            self.enpassant_square = SQUARE_NAMES.index(fields[3])
+        if len(fields) > 4:
+            if not fields[4].isdigit():
+                raise ValueError('bad fen halfmove clock: ' + fen)
+            self.halfmove_clock = int(fields[4])
+        if len(fields) > 5:
+            if not fields[5].isdigit() or int(fields[5]) < 1:
+                raise ValueError('bad fen fullmove number: ' + fen)
+            self.start_ply = 2 * (int(fields[5]) - 1)
+        if not self.white_to_move:
+            self.start_ply += 1
+
+    # the castling rights whose king and rook are still on their home squares, keeping another right
+    # would castle a missing rook
+    def usable_castle_rights(self, rights) -> int:
+        for right, (king, king_sq, rook, rook_sq) in CASTLING_HOMES.items():
+            if self.squares[king_sq] != king or self.squares[rook_sq] != rook:
+                rights &= ~right
+        return rights
+
+    # an enpassant square has to be one an enemy pawn just passed over with a double push: behind that
+    # pawn, on the side to move's sixth rank, with it and the pawn's start square empty, otherwise the
+    # capture would take a pawn that isn't there
+    def is_enpassant_possible(self, sq) -> bool:
+        if not 0 <= sq < 64:
+            return False
+        if self.white_to_move:
+            row, pawn, start = 2, sq + 8, sq - 8
+            enemy_pawn = BP
+        else:
+            row, pawn, start = 5, sq - 8, sq + 8
+            enemy_pawn = WP
+        squares = self.squares
+        return (sq // 8 == row and squares[pawn] == enemy_pawn and squares[sq] == EMPTY and
+                squares[start] == EMPTY)
+
+    # the board, turn, castling and enpassant fields shared by fen and epd
+    def get_position_fields(self) -> str:
+        rows = []
+        for row in range(8):
+            text = ''
+            empty = 0
+            for piece in self.squares[row * 8:row * 8 + 8]:
+                if piece == EMPTY:
+                    empty += 1
+                else:
+                    if empty:
+                        text += str(empty)
+                        empty = 0
+                    text += FEN_PIECES[piece]
+            rows.append(text + str(empty) if empty else text)
+        rights = ''.join(char for char, bit in CASTLING_LETTERS.items() if self.castle_rights & bit)
+        enpassant = SQUARE_NAMES[self.enpassant_square] if self.enpassant_square != -1 else '-'
+        return '/'.join(rows) + (' w ' if self.white_to_move else ' b ') + (rights or '-') + ' ' + enpassant
+
+    # gets the current position as a fen string
+    def get_fen(self) -> str:
+        return self.get_position_fields() + ' ' + str(self.halfmove_clock) + ' ' + str(self.fullmove_number)
+
+    # gets the current position as an epd line followed by operations given as {opcode: [operands]}
+    def get_epd(self, operations=None) -> str:
+        epd = self.get_position_fields()
+        for opcode, operands in (operations or {}).items():
+            if isinstance(operands, str):
+                operands = [operands]
+            epd += ' ' + ' '.join([opcode] + ['"' + operand + '"' if ' ' in operand or ';' in operand else operand
+                                              for operand in operands]) + ';'
+        return epd
+
+    # number of the current full move, starting at 1 and going up after every black move
+    @property
+    def fullmove_number(self) -> int:
+        return (self.start_ply + self.ply) // 2 + 1
+
+    # writes the position into a buffer as SNAPSHOT.size bytes, cheap to send between processes
+    def write_snapshot(self, buffer, offset=0):
+        squares = self.squares
+        board = bytes([squares[i] | squares[i + 1] << 4 for i in range(0, 64, 2)])
+        SNAPSHOT.pack_into(buffer, offset, board, self.castle_rights | (0 if self.white_to_move else 16),
+                           self.enpassant_square, min(self.halfmove_clock, 255), self.fullmove_number)
+
+    # gets the position as snapshot bytes
+    def get_snapshot(self) -> bytes:
+        buffer = bytearray(SNAPSHOT.size)
+        self.write_snapshot(buffer)
+        return bytes(buffer)
+
+    # replaces the game with a position written by write_snapshot
+    def read_snapshot(self, buffer, offset=0):
+        board, state, enpassant, halfmove, fullmove = SNAPSHOT.unpack_from(buffer, offset)
+        self.clear()
+        sq = 0
+        for byte in board:
+            if byte != EMPTY | EMPTY << 4:
+                for piece in (byte & 15, byte >> 4):
+                    if piece < EMPTY:
+                        self.put_piece(piece, sq)
+                    elif piece > EMPTY:
+                        raise ValueError('bad piece code in snapshot: ' + str(piece))
+                    sq += 1
+            else:
+                sq += 2
+        if self.bitboards[WK] == 0 or self.bitboards[BK] == 0:
+            raise ValueError('snapshot needs both kings')
+        self.white_to_move = not state & 16
+        self.castle_rights = self.usable_castle_rights(state & 15)
+        if enpassant != -1 and not self.is_enpassant_possible(enpassant):
+            raise ValueError('bad enpassant square in snapshot: ' + str(enpassant))
+        self.enpassant_square = enpassant
+        self.halfmove_clock = halfmove
+        self.start_ply = 2 * (max(fullmove, 1) - 1) + (0 if self.white_to_move else 1)
+        # put_piece already hashed the pieces
+        self.zobrist ^= self.state_key()
+        self.start_fen = self.get_fen()
+
+    # finds the valid move written in uci notation like e2e4 or e7e8q, None if there is no such move
+    def parse_uci_move(self, uci):
+        for move in self.get_valid_moves():
+            if move_to_uci(move) == uci:
+                return move
+        return None
+
+    # finds the valid move written in standard algebraic notation like Nf3, exd5, O-O or e8=Q, None if there is none
+    def parse_san(self, san):
+        san = san.rstrip('+#!?')
+        moves = self.get_valid_moves()
+        if san in ('O-O', 'O-O-O', '0-0', '0-0-0'):
+            for move in moves:
+                if move >> 12 == 2 and (move >> 6 & 63 > move & 63) == (len(san) == 3):
+                    return move
+            return None
+        promotion = None
+        if '=' in san:
+            san, promotion = san.split('=', 1)
+            promotion = promotion.upper()
+        elif len(san) > 2 and san[-1] in 'QRBNqrbn' and san[-2] in '18':
+            san, promotion = san[:-1], san[-1].upper()
+        piece = 'P'
+        if san[:1] in ('N', 'B', 'R', 'Q', 'K'):
+            piece, san = san[0], san[1:]
+        san = san.replace('x', '').replace('-', '')
+        if san[-2:] not in SQUARE_NAMES:
+            return None
+        end = SQUARE_NAMES.index(san[-2:])
+        # whatever comes before the end square is the start file, rank or both
+        hint = san[:-2]
+        piece = FEN_PIECES.index(piece if self.white_to_move else piece.lower())
+        for move in moves:
+            start = move & 63
+            if move >> 6 & 63 != end or self.squares[start] != piece:
+                continue
+            if (PROMOTION_PIECES[move >> 12 & 3] if move & MOVE_PROMOTION else None) != promotion:
+                continue
+            if all(char in SQUARE_NAMES[start] for char in hint):
+                return move
+        return None
+
+    # writes a valid move in standard algebraic notation, adding the file, rank or both of its start square
+    # when another piece of the same kind can reach the end square, and + or # when it gives check or mate
+    def get_san(self, move) -> str:
+        start, end = move & 63, move >> 6 & 63
+        if move >> 12 == 2:
+            san = 'O-O' if end > start else 'O-O-O'
+        else:
+            piece = self.squares[start]
+            capture = 'x' if self.squares[end] != EMPTY or move >> 12 == 1 else ''
+            if piece in (WP, BP):
+                san = (SQUARE_NAMES[start][0] + capture if capture else '') + SQUARE_NAMES[end]
+                if move & MOVE_PROMOTION:
+                    san += '=' + PROMOTION_PIECES[move >> 12 & 3]
+            else:
+                others = [SQUARE_NAMES[other & 63] for other in self.get_valid_moves()
+                          if other >> 6 & 63 == end and other & 63 != start and self.squares[other & 63] == piece]
+                name = SQUARE_NAMES[start]
+                hint = ''
+                if others:
+                    if all(other[0] != name[0] for other in others):
+                        hint = name[0]
+                    elif all(other[1] != name[1] for other in others):
+                        hint = name[1]
+                    else:
+                        hint = name
+                san = FEN_PIECES[piece].upper() + hint + capture + SQUARE_NAMES[end]
+        self.make_move(move)
+        if self.in_check():
+            san += '+' if self.get_valid_moves() else '#'
+        self.undo_move()
+        return san
+
+    # finds the valid move between two squares, pawns reaching the last row promote to promotion_piece
+    def find_move(self, start, end, promotion_piece='Q'):
+        for move in self.get_valid_moves():
+            if move & 63 == start and move >> 6 & 63 == end and (
+                    not move & MOVE_PROMOTION or PROMOTION_PIECES[move >> 12 & 3] == promotion_piece):
+                return move
+        return None
+
+    # the moves played since the start position in uci notation
+    def get_uci_moves(self) -> list:
+        return [move_to_uci(move) for move in self.move_log]
+
+    # moves played since the start position, read from the undo stack
+    @property
+    def move_log(self) -> list:
+        return self.undo_stack[0:self.ply * UNDO_FIELDS:UNDO_FIELDS]
+
+    # readable view of a move about to be played, for the gui and for printing
+    def move_view(self, move):
+        return Move(move, self.squares[move & 63], self.squares[move >> 6 & 63])
+
+    # readable view of the last move played, None before the first move
+    def last_move_view(self):
+        if not self.ply:
+            return None
+        i = (self.ply - 1) * UNDO_FIELDS
+        move = self.undo_stack[i]
+        piece = self.squares[move >> 6 & 63]
+        if move & MOVE_PROMOTION:
+            piece = WP if piece < BP else BP
+        captured = EMPTY if move & MOVE_ENPASSANT else self.undo_stack[i + 1]
+        return Move(move, piece, captured)
+
+    # 8x8 view of the board in the two character notation used by the gui
+    @property
+    def board(self) -> list:
+        names = [PIECE_NAMES[piece] for piece in self.squares]
+        return [names[row * 8:row * 8 + 8] for row in range(8)]
+
+    # king locations as (row, col)
+    @property
+    def white_king(self) -> tuple:
+        return divmod(self.king_squares[WHITE], 8)
+
+    @property
+    def black_king(self) -> tuple:
+        return divmod(self.king_squares[BLACK], 8)
+
+    # square where enpassant is possible as (row, col) or () if there is none
+    @property
+    def enpassant_possible(self) -> tuple:
+        return divmod(self.enpassant_square, 8) if self.enpassant_square != -1 else ()
+
+    # places a piece on an empty square
+    def put_piece(self, piece, sq):
+        bit = 1 << sq
+        self.bitboards[piece] |= bit
+        self.occupancy[piece // 6] |= bit
+        self.occupied |= bit
+        self.squares[sq] = piece
+        self.zobrist ^= ZOBRIST_PIECES[piece][sq]
+        self.material += PIECE_VALUES[piece]
+        self.positional += PIECE_SQUARE_VALUES[piece][sq]
+        if piece == WK or piece == BK:
+            self.king_squares[piece // 6] = sq
+
+    # removes a piece from its square
+    def remove_piece(self, piece, sq):
+        bit = 1 << sq
+        self.bitboards[piece] ^= bit
+        self.occupancy[piece // 6] ^= bit
+        self.occupied ^= bit
+        self.squares[sq] = EMPTY
+        self.zobrist ^= ZOBRIST_PIECES[piece][sq]
+        self.material -= PIECE_VALUES[piece]
+        self.positional -= PIECE_SQUARE_VALUES[piece][sq]
+
+    # moves a piece to an empty square
+    def move_piece(self, piece, start, end):
+        bits = (1 << start) | (1 << end)
+        self.bitboards[piece] ^= bits
+        self.occupancy[piece // 6] ^= bits
+        self.occupied ^= bits
+        self.squares[start] = EMPTY
+        self.squares[end] = piece
+        self.zobrist ^= ZOBRIST_PIECES[piece][start] ^ ZOBRIST_PIECES[piece][end]
+        self.positional += PIECE_SQUARE_VALUES[piece][end] - PIECE_SQUARE_VALUES[piece][start]
+        if piece == WK or piece == BK:
+            self.king_squares[piece // 6] = end
+
+    # hashes the side to move, castling rights and enpassant square, xored in and out around every move
+    def state_key(self) -> int:
+        key = ZOBRIST_CASTLING[self.castle_rights]
+        if not self.white_to_move:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        if self.enpassant_square != -1:
+            key ^= ZOBRIST_ENPASSANT[self.enpassant_square % 8]
+        return key
+
+    # passes the turn without moving for the search's null move pruning, returns what undo_null_move needs
+    def make_null_move(self):
+        state = (self.enpassant_square, self.zobrist, self.halfmove_clock)
+        self.zobrist ^= self.state_key()
+        self.enpassant_square = -1
+        self.white_to_move = not self.white_to_move
+        self.zobrist ^= self.state_key()
+        self.halfmove_clock = 0
+        return state
+
+    def undo_null_move(self, state):
+        self.enpassant_square, self.zobrist, self.halfmove_clock = state
+        self.white_to_move = not self.white_to_move
+
+    # computes the zobrist hash from scratch, the incremental hash must always equal this
+    def compute_zobrist(self) -> int:
+        key = self.state_key()
+        for sq, piece in enumerate(self.squares):
+            if piece != EMPTY:
+                key ^= ZOBRIST_PIECES[piece][sq]
+        return key
 
     # make a move
     def make_move(self, move):
-        self.board[move.start_row][move.start_col] = '--'
-        self.board[move.end_row][move.end_col] = move.piece_moved
-        self.move_log.append(move)
+        start, end = move & 63, move >> 6 & 63
+        flag = move >> 12
+        piece = self.squares[start]
+        captured = self.squares[end]
+        # save what the move can't give back on the undo stack, doubling it in the rare game that outgrows it
+        stack = self.undo_stack
+        i = self.ply * UNDO_FIELDS
+        if i == len(stack):
+            stack.extend([0] * len(stack))
+        stack[i] = move
+        stack[i + 2] = self.enpassant_square
+        stack[i + 3] = self.castle_rights
+        stack[i + 4] = self.zobrist
+        stack[i + 5] = self.halfmove_clock
+        self.ply += 1
+        self.zobrist ^= self.state_key()
+        if captured != EMPTY:
+            self.remove_piece(captured, end)
+        self.move_piece(piece, start, end)
         self.white_to_move = not self.white_to_move
-        # update kings location if piece moved is king
-        if move.piece_moved == 'wK':
-            self.white_king = (move.end_row, move.end_col)
-        elif move.piece_moved == 'bK':
-            self.black_king = (move.end_row, move.end_col)
-        # check for pawn promotion add options later
-        if move.is_pawn_promotion:
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + 'Q'
+        # check for pawn promotion
+        if flag & 4:
+            self.remove_piece(piece, end)
+            self.put_piece(piece + PROMOTION_OFFSETS[flag & 3], end)
         # check for enpassant
-        if move.is_enpassant:
-            self.board[move.start_row][move.end_col] = '--'
-        # update square where enpassant is possible
-        if move.piece_moved[1] == 'p' and abs(move.start_row - move.end_row) == 2:
-            self.enpassant_possible = ((move.start_row + move.end_row) // 2, move.start_col)
-        else:
-            self.enpassant_possible = ()
+        elif flag == 1:
+            captured = BP if piece == WP else WP
+            self.remove_piece(captured, start - start % 8 + end % 8)
         # check for castle
-        if move.is_castle:
+        elif flag == 2:
+            rook = WR if piece == WK else BR
             # king side
-            if move.end_col - move.start_col == 2:
-                self.board[move.end_row][move.end_col - 1] = self.board[move.end_row][move.end_col + 1]
-                self.board[move.end_row][move.end_col + 1] = '--'
+            if end > start:
+                self.move_piece(rook, end + 1, end - 1)
             # queen side
             else:
-                self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][move.end_col - 2]
-                self.board[move.end_row][move.end_col - 2] = '--'
-        self.enpassant_possible_log.append(self.enpassant_possible)
-        # update castling rights and castle log
-        self.update_castle_rights(move)
-        self.castle_rights_log.append(CastleRights(self.current_castle_rights.wks, self.current_castle_rights.bks,
-                                                   self.current_castle_rights.wqs, self.current_castle_rights.bqs))
+                self.move_piece(rook, end - 2, end + 1)
+        stack[i + 1] = captured
+        # update square where enpassant is possible and the halfmove clock
+        if piece == WP or piece == BP:
+            self.enpassant_square = (start + end) // 2 if abs(start - end) == 16 else -1
+            self.halfmove_clock = 0
+        else:
+            self.enpassant_square = -1
+            self.halfmove_clock = 0 if captured != EMPTY else self.halfmove_clock + 1
+        # update castling rights
+        self.castle_rights &= CASTLE_MASKS[start] & CASTLE_MASKS[end]
+        self.zobrist ^= self.state_key()
 
     # undo a move
     def undo_move(self):
-        if len(self.move_log) != 0:
-            # get last move from move log
-            last_move = self.move_log.pop()
+        if self.ply != 0:
+            # get last move and the state from before it from the undo stack
+            self.ply -= 1
+            stack = self.undo_stack
+            i = self.ply * UNDO_FIELDS
+            last_move = stack[i]
+            captured = stack[i + 1]
+            start, end = last_move & 63, last_move >> 6 & 63
+            flag = last_move >> 12
+            piece = self.squares[end]
+            # take back a promoted piece before moving the pawn back
+            if flag & 4:
+                self.remove_piece(piece, end)
+                piece = WP if piece < BP else BP
+                self.put_piece(piece, end)
             # reverse last move and turn
-            self.board[last_move.start_row][last_move.start_col] = last_move.piece_moved
-            self.board[last_move.end_row][last_move.end_col] = last_move.piece_captured
-            self.white_to_move = not self.white_to_move
-            # update kings location if last piece moved is king
-            if last_move.piece_moved == 'wK':
-                self.white_king = (last_move.start_row, last_move.start_col)
-            elif last_move.piece_moved == 'bK':
-                self.black_king = (last_move.start_row, last_move.start_col)
-            # reverse enpassant
-            if last_move.is_enpassant:
-                self.board[last_move.end_row][last_move.end_col] = '--'
-                self.board[last_move.start_row][last_move.end_col] = last_move.piece_captured
-            self.enpassant_possible_log.pop()
-            self.enpassant_possible = self.enpassant_possible_log[-1]
-            # update castle rights
-            self.castle_rights_log.pop()
-            new_rights = self.castle_rights_log[-1]
-            self.current_castle_rights = CastleRights(new_rights.wks, new_rights.bks, new_rights.wqs, new_rights.bqs)
+            self.move_piece(piece, end, start)
+            if flag == 1:
+                self.put_piece(captured, start - start % 8 + end % 8)
+            elif captured != EMPTY:
+                self.put_piece(captured, end)
             # reverse castle
-            if last_move.is_castle:
+            elif flag == 2:
+                rook = WR if piece == WK else BR
                 # king side
-                if last_move.end_col - last_move.start_col == 2:
-                    self.board[last_move.end_row][last_move.end_col + 1] = self.board[last_move.end_row][
-                        last_move.end_col - 1]
-                    self.board[last_move.end_row][last_move.end_col - 1] = '--'
+                if end > start:
+                    self.move_piece(rook, end - 1, end + 1)
                 # queen side
                 else:
-                    self.board[last_move.end_row][last_move.end_col - 2] = self.board[last_move.end_row][
-                        last_move.end_col + 1]
-                    self.board[last_move.end_row][last_move.end_col + 1] = '--'
+                    self.move_piece(rook, end + 1, end - 2)
+            self.white_to_move = not self.white_to_move
+            self.enpassant_square = stack[i + 2]
+            self.castle_rights = stack[i + 3]
+            self.zobrist = stack[i + 4]
+            self.halfmove_clock = stack[i + 5]
             self.checkmate = False
             self.stalemate = False
             self.resign = False
 
-    # after every move check if player still has the ability to castle
-    def update_castle_rights(self, move):
-        if move.piece_moved == 'wK':
-            self.current_castle_rights.wks = False
-            self.current_castle_rights.wqs = False
-        elif move.piece_moved == 'bK':
-            self.current_castle_rights.bks = False
-            self.current_castle_rights.bqs = False
-        elif move.piece_moved == 'wR':
-            if move.start_row == 7:
-                if move.start_col == 0:
-                    self.current_castle_rights.wqs = False
-                elif move.start_col == 7:
-                    self.current_castle_rights.wks = False
-        elif move.piece_moved == 'bR':
-            if move.start_row == 0:
-                if move.start_col == 0:
-                    self.current_castle_rights.bqs = False
-                elif move.start_col == 7:
-                    self.current_castle_rights.bks = False
-        if move.piece_captured == 'wR':
-            if move.end_row == 7:
-                if move.end_col == 0:
-                    self.current_castle_rights.wqs = False
-                elif move.end_col == 7:
-                    self.current_castle_rights.wks = False
-        elif move.piece_captured == 'bR':
-            if move.end_row == 0:
-                if move.end_col == 0:
-                    self.current_castle_rights.bqs = False
-                elif move.end_col == 7:
-                    self.current_castle_rights.bks = False
-
     # gets all valid moves considering checks and pins
     def get_valid_moves(self) -> list:
-        # create temp variables to store current attributes so no changes are made
-        temp_enpassant_possible = self.enpassant_possible
-        temp_castle_rights = CastleRights(self.current_castle_rights.wks, self.current_castle_rights.bks,
-                                          self.current_castle_rights.wqs, self.current_castle_rights.bqs)
-        # get all possible moves
-        moves = self.all_possible_moves()
-        # get castling moves
-        if self.white_to_move:
-            self.get_castle_moves(self.white_king[0], self.white_king[1], moves)
-        else:
-            self.get_castle_moves(self.black_king[0], self.black_king[1], moves)
-        # simulate all current player moves and check for checks
-        for i in range(len(moves) - 1, -1, -1):
-            self.make_move(moves[i])
-            self.white_to_move = not self.white_to_move
-            if self.in_check():
-                moves.remove(moves[i])
-            self.white_to_move = not self.white_to_move
-            self.undo_move()
+        moves = self.generate_moves(GEN_ALL)
         # checkmate and stalemate conditions
         if len(moves) == 0:
             if self.in_check():
@@ -178,292 +802,369 @@ class GameState:
         else:
             self.checkmate = False
             self.stalemate = False
-        # reset current attributes after simulation
-        self.enpassant_possible = temp_enpassant_possible
-        self.current_castle_rights = temp_castle_rights
         # returns list of all valid moves for current player
         return moves
 
-    # check for checks helps get_valid_moves
+    # gets the valid captures and promotions, used by the quiescence search
+    def get_capture_moves(self) -> list:
+        return self.generate_moves(GEN_CAPTURES)
+
+    # gets the valid moves that neither capture nor promote, for the last stages of the search's move picker
+    def get_quiet_moves(self) -> list:
+        return self.generate_moves(GEN_QUIETS)
+
+    # generates legal moves of the given kind using the checkers and pins found from the king
+    def generate_moves(self, kind) -> list:
+        moves = []
+        color = WHITE if self.white_to_move else BLACK
+        offset = 6 * color
+        bitboards = self.bitboards
+        king_sq = self.king_squares[color]
+        checkers, pinned = self.checks_and_pins(color)
+        enemies = self.occupancy[color ^ 1]
+        # the king steps to any square that stays unattacked once it has left its own square
+        king_targets = KING_ATTACKS[king_sq] & ~self.occupancy[color]
+        if kind == GEN_CAPTURES:
+            king_targets &= enemies
+        elif kind == GEN_QUIETS:
+            king_targets &= ~enemies
+        occupied = self.occupied ^ (1 << king_sq)
+        while king_targets:
+            bit = king_targets & -king_targets
+            king_targets ^= bit
+            if not self.is_attacked(bit.bit_length() - 1, color ^ 1, occupied):
+                self.add_moves(king_sq, bit, moves)
+        # against a double check only the king can move
+        if not checkers & (checkers - 1):
+            # other pieces must capture the checker or block its ray
+            if checkers:
+                targets = (checkers | BETWEEN[king_sq][checkers.bit_length() - 1]) & ~self.occupancy[color]
+            else:
+                targets = FULL ^ self.occupancy[color]
+                if kind & GEN_QUIETS:
+                    self.get_castle_moves(king_sq // 8, king_sq % 8, moves)
+            # captures are the pieces taking something and pawns taking or pushing to promote, quiet moves
+            # the rest
+            if kind == GEN_ALL:
+                push_targets = targets
+            elif kind == GEN_CAPTURES:
+                push_targets = targets & PROMOTION_RANKS
+                targets &= enemies
+            else:
+                push_targets = targets & ~PROMOTION_RANKS
+                targets &= ~enemies
+            free = ~pinned
+            self.pawn_moves(color, bitboards[WP + offset] & free, targets, push_targets, moves)
+            self.knight_moves(bitboards[WN + offset] & free, targets, moves)
+            self.bishop_moves((bitboards[WB + offset] | bitboards[WQ + offset]) & free, targets, moves)
+            self.rook_moves((bitboards[WR + offset] | bitboards[WQ + offset]) & free, targets, moves)
+            # pinned pieces may only move along the line between their king and the pinning piece
+            while pinned:
+                bit = pinned & -pinned
+                pinned ^= bit
+                sq = bit.bit_length() - 1
+                pin_targets = targets & LINE[king_sq][sq]
+                piece = self.squares[sq] - offset
+                if piece == WP:
+                    self.pawn_moves(color, bit, pin_targets, push_targets & LINE[king_sq][sq], moves)
+                elif piece == WB:
+                    self.bishop_moves(bit, pin_targets, moves)
+                elif piece == WR:
+                    self.rook_moves(bit, pin_targets, moves)
+                elif piece == WQ:
+                    self.bishop_moves(bit, pin_targets, moves)
+                    self.rook_moves(bit, pin_targets, moves)
+            if kind & GEN_CAPTURES:
+                self.enpassant_moves(color, king_sq, moves)
+        return moves
+
+    # checks that a move, which may come from another position like a hash or killer move, is valid here
+    # without generating the moves, enpassant and castling are rare enough to look up in the generated moves
+    def is_legal(self, move) -> bool:
+        start, end, flag = move & 63, move >> 6 & 63, move >> 12
+        color = WHITE if self.white_to_move else BLACK
+        piece = self.squares[start]
+        if piece == EMPTY or piece // 6 != color or self.occupancy[color] >> end & 1:
+            return False
+        if flag == 1 or flag == 2:
+            return move in self.generate_moves(GEN_ALL)
+        piece -= 6 * color
+        if piece == WP:
+            if bool(flag & 4) != bool(PROMOTION_RANKS >> end & 1) or flag and not flag & 4:
+                return False
+            forward = -8 if color == WHITE else 8
+            if self.squares[end] != EMPTY:
+                if not PAWN_ATTACKS[color][start] >> end & 1:
+                    return False
+            elif end != start + forward and (end != start + 2 * forward or self.squares[start + forward] != EMPTY or
+                                             not (RANK_3 if color == WHITE else RANK_6) >> (start + forward) & 1):
+                return False
+        elif flag:
+            return False
+        elif piece == WK:
+            return bool(KING_ATTACKS[start] >> end & 1) and not self.is_attacked(
+                end, color ^ 1, self.occupied ^ (1 << start))
+        elif piece == WN:
+            if not KNIGHT_ATTACKS[start] >> end & 1:
+                return False
+        else:
+            attacks = 0
+            if piece != WR:
+                attacks |= bishop_attacks(start, self.occupied)
+            if piece != WB:
+                attacks |= rook_attacks(start, self.occupied)
+            if not attacks >> end & 1:
+                return False
+        # the same check and pin rules as generate_moves
+        king_sq = self.king_squares[color]
+        checkers, pinned = self.checks_and_pins(color)
+        if checkers and (checkers & (checkers - 1) or
+                         not (checkers | BETWEEN[king_sq][checkers.bit_length() - 1]) >> end & 1):
+            return False
+        return not pinned >> start & 1 or bool(LINE[king_sq][start] >> end & 1)
+
+    # pieces of both colours attacking a square with the given occupancy
+    def attackers_to(self, sq, occupied) -> int:
+        bitboards = self.bitboards
+        queens = bitboards[WQ] | bitboards[BQ]
+        return ((PAWN_ATTACKS[BLACK][sq] & bitboards[WP]) | (PAWN_ATTACKS[WHITE][sq] & bitboards[BP]) |
+                (KNIGHT_ATTACKS[sq] & (bitboards[WN] | bitboards[BN])) |
+                (KING_ATTACKS[sq] & (bitboards[WK] | bitboards[BK])) |
+                (bishop_attacks(sq, occupied) & (bitboards[WB] | bitboards[BB] | queens)) |
+                (rook_attacks(sq, occupied) & (bitboards[WR] | bitboards[BR] | queens))) & occupied
+
+    # static exchange evaluation, the material the side to move wins or loses if both sides keep capturing
+    # on the move's end square with their least valuable piece, sliders behind a capturer join in as it leaves
+    def static_exchange(self, move) -> int:
+        start, end = move & 63, move >> 6 & 63
+        squares = self.squares
+        occupied = self.occupied ^ (1 << start)
+        if move >> 12 == 1:
+            captured = end + (8 if self.white_to_move else -8)
+            occupied ^= 1 << captured
+            gains = [EXCHANGE_VALUES[WP]]
+        else:
+            gains = [EXCHANGE_VALUES[squares[end]]]
+        on_square = EXCHANGE_VALUES[squares[start]]
+        if move & MOVE_PROMOTION:
+            on_square = EXCHANGE_VALUES[WP + PROMOTION_OFFSETS[move >> 12 & 3]]
+            gains[0] += on_square - EXCHANGE_VALUES[WP]
+        color = BLACK if self.white_to_move else WHITE
+        bitboards = self.bitboards
+        while True:
+            attackers = self.attackers_to(end, occupied) & self.occupancy[color]
+            if not attackers:
+                break
+            # the next capture takes whatever stands on the square now
+            gains.append(on_square - gains[-1])
+            if max(-gains[-2], gains[-1]) < 0:
+                break
+            for piece in range(WP + 6 * color, WK + 6 * color + 1):
+                bits = attackers & bitboards[piece]
+                if bits:
+                    occupied ^= bits & -bits
+                    on_square = EXCHANGE_VALUES[piece]
+                    break
+            color ^= 1
+        # each side may stop capturing when going on would lose material
+        for i in range(len(gains) - 1, 0, -1):
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+        return gains[0]
+
+    # finds the pieces checking the king of the given colour and the friendly pieces pinned to it
+    def checks_and_pins(self, color) -> tuple:
+        bitboards = self.bitboards
+        offset = 6 * (color ^ 1)
+        king_sq = self.king_squares[color]
+        checkers = ((KNIGHT_ATTACKS[king_sq] & bitboards[WN + offset]) |
+                    (PAWN_ATTACKS[color][king_sq] & bitboards[WP + offset]))
+        pinned = 0
+        # enemy sliders on an open line to the king give check, with one friendly piece between they pin it
+        queens = bitboards[WQ + offset]
+        snipers = ((ROOK_RAYS[king_sq] & (bitboards[WR + offset] | queens)) |
+                   (BISHOP_RAYS[king_sq] & (bitboards[WB + offset] | queens)))
+        while snipers:
+            bit = snipers & -snipers
+            snipers ^= bit
+            blockers = BETWEEN[king_sq][bit.bit_length() - 1] & self.occupied
+            if not blockers:
+                checkers |= bit
+            elif not blockers & (blockers - 1) and blockers & self.occupancy[color]:
+                pinned |= blockers
+        return checkers, pinned
+
+    # checks if the current position occurred count times before, the zobrist hash of every earlier position
+    # is on the undo stack and only the ones since the last capture or pawn move can come back, a position
+    # also needs two moves by each side to come back so the search starts four plies back
+    def is_repetition(self, count=1) -> bool:
+        key = self.zobrist
+        stack = self.undo_stack
+        found = 0
+        for ply in range(self.ply - 4, max(self.ply - self.halfmove_clock, 0) - 1, -2):
+            if stack[ply * UNDO_FIELDS + 4] == key:
+                found += 1
+                if found == count:
+                    return True
+        return False
+
+    # a draw by the fifty move rule or by the position coming up a third time
+    def is_draw(self) -> bool:
+        return self.halfmove_clock >= 100 or self.is_repetition(2)
+
+    # check for checks
     def in_check(self) -> bool:
         if self.white_to_move:
-            return self.square_under_attack(self.white_king[0], self.white_king[1])
+            return self.is_attacked(self.king_squares[WHITE], BLACK)
         else:
-            return self.square_under_attack(self.black_king[0], self.black_king[1])
+            return self.is_attacked(self.king_squares[BLACK], WHITE)
 
-    # check for a square under attack helps in_check and get_valid_moves
+    # check for a square under attack by the opponent
     def square_under_attack(self, row, col) -> bool:
-        # simulate all opponent moves
-        self.white_to_move = not self.white_to_move
-        opp_moves = self.all_possible_moves()
-        self.white_to_move = not self.white_to_move
-        for move in opp_moves:
-            if move.end_row == row and move.end_col == col:
-                return True
+        return self.is_attacked(row * 8 + col, BLACK if self.white_to_move else WHITE)
+
+    # checks if any piece of the given colour attacks a square by looking outwards from it
+    def is_attacked(self, sq, color, occupied=None) -> bool:
+        if occupied is None:
+            occupied = self.occupied
+        bitboards = self.bitboards
+        offset = 6 * color
+        if KNIGHT_ATTACKS[sq] & bitboards[WN + offset]:
+            return True
+        if PAWN_ATTACKS[color ^ 1][sq] & bitboards[WP + offset]:
+            return True
+        if KING_ATTACKS[sq] & bitboards[WK + offset]:
+            return True
+        queens = bitboards[WQ + offset]
+        if BISHOP_RAYS[sq] & (bitboards[WB + offset] | queens) and (
+                bishop_attacks(sq, occupied) & (bitboards[WB + offset] | queens)):
+            return True
+        if ROOK_RAYS[sq] & (bitboards[WR + offset] | queens) and (
+                rook_attacks(sq, occupied) & (bitboards[WR + offset] | queens)):
+            return True
         return False
 
-    # gets all possible moves for current player without considering checks and pins
-    def all_possible_moves(self) -> list:
-        moves = []
-        for i in range(len(self.board)):
-            for j in range(len(self.board[i])):
-                turn, piece = self.board[i][j][0], self.board[i][j][1]
-                if (turn == 'w' and self.white_to_move) or (turn == 'b' and not self.white_to_move):
-                    self.move_funcs[piece](i, j, moves)
-        # returns a list of all possible moves
-        return moves
+    # adds a move for every bit in targets reached from start helps the move generators
+    def add_moves(self, start, targets, moves):
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            moves.append(start | (bit.bit_length() - 1) << 6)
 
-    # gets all possible pawn moves helps all_possible_moves
-    def pawn_moves(self, row, col, moves):
-        # white
-        if self.white_to_move:
-            # forward
-            if row - 1 >= 0:
-                if row == 6:
-                    if self.board[row - 1][col] == '--':
-                        moves.append(Move((row, col), (row - 1, col), self.board))
-                        if self.board[row - 2][col] == '--':
-                            moves.append(Move((row, col), (row - 2, col), self.board))
-                else:
-                    if self.board[row - 1][col] == '--':
-                        moves.append(Move((row, col), (row - 1, col), self.board))
-                # capture left
-                if col - 1 >= 0:
-                    if self.board[row - 1][col - 1][0] == 'b':
-                        moves.append(Move((row, col), (row - 1, col - 1), self.board))
-                    # enpassant
-                    elif (row - 1, col - 1) == self.enpassant_possible:
-                        moves.append(Move((row, col), (row - 1, col - 1), self.board, True))
-                # capture right
-                if col + 1 <= 7:
-                    if self.board[row - 1][col + 1][0] == 'b':
-                        moves.append(Move((row, col), (row - 1, col + 1), self.board))
-                    # enpassant
-                    elif (row - 1, col + 1) == self.enpassant_possible:
-                        moves.append(Move((row, col), (row - 1, col + 1), self.board, True))
-        # black
+    # gets pawn captures landing on targets and pushes landing on push_targets helps generate_moves
+    def pawn_moves(self, color, pawns, targets, push_targets, moves):
+        empty = FULL ^ self.occupied
+        enemies = self.occupancy[color ^ 1] & targets
+        # white pawns move towards row 0, so towards lower square numbers
+        if color == WHITE:
+            single = (pawns >> 8) & empty
+            double = ((single & RANK_3) >> 8) & empty & push_targets
+            left = ((pawns & NOT_FILE_A) >> 9) & enemies
+            right = ((pawns & NOT_FILE_H) >> 7) & enemies
+            forward = -8
+        # black pawns move towards row 7
         else:
-            # forward
-            if row + 1 <= 7:
-                if row == 1:
-                    if self.board[row + 1][col] == '--':
-                        moves.append(Move((row, col), (row + 1, col), self.board))
-                        if self.board[row + 2][col] == '--':
-                            moves.append(Move((row, col), (row + 2, col), self.board))
-                else:
-                    if self.board[row + 1][col] == '--':
-                        moves.append(Move((row, col), (row + 1, col), self.board))
-                # capture right
-                if col - 1 >= 0:
-                    if self.board[row + 1][col - 1][0] == 'w':
-                        moves.append(Move((row, col), (row + 1, col - 1), self.board))
-                    # enpassant
-                    elif (row + 1, col - 1) == self.enpassant_possible:
-                        moves.append(Move((row, col), (row + 1, col - 1), self.board, True))
-                # capture left
-                if col + 1 <= 7:
-                    if self.board[row + 1][col + 1][0] == 'w':
-                        moves.append(Move((row, col), (row + 1, col + 1), self.board))
-                    # enpassant
-                    elif (row + 1, col + 1) == self.enpassant_possible:
-                        moves.append(Move((row, col), (row + 1, col + 1), self.board, True))
-
-    # gets all possible rook moves helps all_possible_moves
-    def rook_moves(self, row, col, moves):
-        # (-1,0) direction
-        for i in range(col - 1, -1, -1):
-            if self.board[row][i] == '--':
-                moves.append(Move((row, col), (row, i), self.board))
-            else:
-                if self.board[row][col][0] == 'w' and self.board[row][i][0] == 'b':
-                    moves.append(Move((row, col), (row, i), self.board))
-                    break
-                elif self.board[row][col][0] == 'b' and self.board[row][i][0] == 'w':
-                    moves.append(Move((row, col), (row, i), self.board))
-                    break
-                else:
-                    break
-        # (1,0) direction
-        for i in range(col + 1, 8, 1):
-            if self.board[row][i] == '--':
-                moves.append(Move((row, col), (row, i), self.board))
-            else:
-                if self.board[row][col][0] == 'w' and self.board[row][i][0] == 'b':
-                    moves.append(Move((row, col), (row, i), self.board))
-                    break
-                if self.board[row][col][0] == 'b' and self.board[row][i][0] == 'w':
-                    moves.append(Move((row, col), (row, i), self.board))
-                    break
-                else:
-                    break
-        # (0,1) direction
-        for i in range(row - 1, -1, -1):
-            if self.board[i][col] == '--':
-                moves.append(Move((row, col), (i, col), self.board))
-            else:
-                if self.board[row][col][0] == 'w' and self.board[i][col][0] == 'b':
-                    moves.append(Move((row, col), (i, col), self.board))
-                    break
-                if self.board[row][col][0] == 'b' and self.board[i][col][0] == 'w':
-                    moves.append(Move((row, col), (i, col), self.board))
-                    break
-                else:
-                    break
-        # (0,-1) direction
-        for i in range(row + 1, 8, 1):
-            if self.board[i][col] == '--':
-                moves.append(Move((row, col), (i, col), self.board))
-            else:
-                if self.board[row][col][0] == 'w' and self.board[i][col][0] == 'b':
-                    moves.append(Move((row, col), (i, col), self.board))
-                    break
-                if self.board[row][col][0] == 'b' and self.board[i][col][0] == 'w':
-                    moves.append(Move((row, col), (i, col), self.board))
-                    break
-                else:
-                    break
+            single = (pawns << 8) & empty
+            double = ((single & RANK_6) << 8) & empty & push_targets
+            left = ((pawns & NOT_FILE_A) << 7) & enemies
+            right = ((pawns & NOT_FILE_H) << 9) & enemies
+            forward = 8
+        self.add_pawn_moves(single & push_targets, forward, moves)
+        self.add_pawn_moves(double, 2 * forward, moves)
+        self.add_pawn_moves(left, forward - 1, moves)
+        self.add_pawn_moves(right, forward + 1, moves)
 
-    # gets all possible knight moves helps all_possible_moves
-    def knight_moves(self, row, col, moves):
-        # check all 8 squares
-        possible_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        friend = 'w' if self.white_to_move else 'b'
-        for move in possible_moves:
-            end_row = row + move[0]
-            end_col = col + move[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                if self.board[end_row][end_col][0] != friend:
-                    moves.append(Move((row, col), (end_row, end_col), self.board))
-
-    # gets all possible bishop moves helps all_possible_moves
-    def bishop_moves(self, row, col, moves):
-        # (1,1) direction
-        i, j = row - 1, col + 1
-        while i >= 0 and j <= 7:
-            if self.board[i][j] == '--':
-                moves.append(Move((row, col), (i, j), self.board))
-                i -= 1
-                j += 1
-            else:
-                if self.board[row][col][0] == 'w' and self.board[i][j][0] == 'b':
-                    moves.append(Move((row, col), (i, j), self.board))
-                    break
-                elif self.board[row][col][0] == 'b' and self.board[i][j][0] == 'w':
-                    moves.append(Move((row, col), (i, j), self.board))
-                    break
-                else:
-                    break
-        # (-1,-1) direction
-        i, j = row + 1, col - 1
-        while j >= 0 and i <= 7:
-            if self.board[i][j] == '--':
-                moves.append(Move((row, col), (i, j), self.board))
-                i += 1
-                j -= 1
-            else:
-                if self.board[row][col][0] == 'w' and self.board[i][j][0] == 'b':
-                    moves.append(Move((row, col), (i, j), self.board))
-                    break
-                elif self.board[row][col][0] == 'b' and self.board[i][j][0] == 'w':
-                    moves.append(Move((row, col), (i, j), self.board))
-                    break
-                else:
-                    break
-        # (1,-1) direction
-        i, j = row + 1, col + 1
-        while i <= 7 and j <= 7:
-            if self.board[i][j] == '--':
-                moves.append(Move((row, col), (i, j), self.board))
-                i += 1
-                j += 1
+    # adds the pawn moves landing on every bit in targets helps pawn_moves
+    def add_pawn_moves(self, targets, shift, moves):
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            end = bit.bit_length() - 1
+            move = end - shift | end << 6
+            # a pawn reaching the last row can promote to any of the four pieces
+            if end < 8 or end >= 56:
+                for flag in PROMOTION_FLAGS:
+                    moves.append(move | flag)
             else:
-                if self.board[row][col][0] == 'w' and self.board[i][j][0] == 'b':
-                    moves.append(Move((row, col), (i, j), self.board))
-                    break
-                elif self.board[row][col][0] == 'b' and self.board[i][j][0] == 'w':
-                    moves.append(Move((row, col), (i, j), self.board))
-                    break
-                else:
-                    break
-        # (-1,1) direction
-        i, j = row - 1, col - 1
-        while i >= 0 and j >= 0:
-            if self.board[i][j] == '--':
-                moves.append(Move((row, col), (i, j), self.board))
-                i -= 1
-                j -= 1
-            else:
-                if self.board[row][col][0] == 'w' and self.board[i][j][0] == 'b':
-                    moves.append(Move((row, col), (i, j), self.board))
-                    break
-                elif self.board[row][col][0] == 'b' and self.board[i][j][0] == 'w':
-                    moves.append(Move((row, col), (i, j), self.board))
-                    break
-                else:
-                    break
+                moves.append(move)
 
-    # gets all possible queen moves helps all_possible_moves
-    def queen_moves(self, row, col, moves):
-        # combine rook and bishop moves
-        self.rook_moves(row, col, moves)
-        self.bishop_moves(row, col, moves)
-
-    # gets all possible king moves helps all_possible_moves
-    def king_moves(self, row, col, moves):
-        # check all 8 squares
-        possible_moves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
-        friend = 'w' if self.white_to_move else 'b'
-        for i in range(8):
-            end_row = row + possible_moves[i][0]
-            end_col = col + possible_moves[i][1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                if self.board[end_row][end_col][0] != friend:
-                    moves.append(Move((row, col), (end_row, end_col), self.board))
-
-    # gets all possible castle moves helps get_valid_moves
-    def get_castle_moves(self, row, col, moves):
-        # cannot castle if checked
-        if self.square_under_attack(row, col):
+    # gets enpassant captures, checked by clearing both pawns and looking for attacks on the king
+    def enpassant_moves(self, color, king_sq, moves):
+        ep = self.enpassant_square
+        if ep == -1:
             return
+        offset = 6 * color
+        enemy_offset = 6 - offset
+        bitboards = self.bitboards
+        captured_bit = 1 << (ep + (8 if color == WHITE else -8))
+        pawns = PAWN_ATTACKS[color ^ 1][ep] & bitboards[WP + offset]
+        while pawns:
+            bit = pawns & -pawns
+            pawns ^= bit
+            occupied = (self.occupied ^ bit ^ captured_bit) | (1 << ep)
+            queens = bitboards[WQ + enemy_offset]
+            if rook_attacks(king_sq, occupied) & (bitboards[WR + enemy_offset] | queens):
+                continue
+            if bishop_attacks(king_sq, occupied) & (bitboards[WB + enemy_offset] | queens):
+                continue
+            if KNIGHT_ATTACKS[king_sq] & bitboards[WN + enemy_offset]:
+                continue
+            if PAWN_ATTACKS[color][king_sq] & bitboards[WP + enemy_offset] & ~captured_bit:
+                continue
+            moves.append(bit.bit_length() - 1 | ep << 6 | MOVE_ENPASSANT)
+
+    # gets all possible knight moves helps generate_moves
+    def knight_moves(self, knights, targets, moves):
+        while knights:
+            bit = knights & -knights
+            knights ^= bit
+            start = bit.bit_length() - 1
+            self.add_moves(start, KNIGHT_ATTACKS[start] & targets, moves)
+
+    # gets all possible bishop moves and diagonal queen moves helps generate_moves
+    def bishop_moves(self, bishops, targets, moves):
+        while bishops:
+            bit = bishops & -bishops
+            bishops ^= bit
+            start = bit.bit_length() - 1
+            self.add_moves(start, bishop_attacks(start, self.occupied) & targets, moves)
+
+    # gets all possible rook moves and straight queen moves helps generate_moves
+    def rook_moves(self, rooks, targets, moves):
+        while rooks:
+            bit = rooks & -rooks
+            rooks ^= bit
+            start = bit.bit_length() - 1
+            self.add_moves(start, rook_attacks(start, self.occupied) & targets, moves)
+
+    # gets all possible castle moves helps generate_moves, only called when the king is not in check
+    def get_castle_moves(self, row, col, moves):
         # kings side castle
-        if (self.white_to_move and self.current_castle_rights.wks == True) or (
-                not self.white_to_move and self.current_castle_rights.bks == True):
+        if self.castle_rights & (WHITE_KING_SIDE if self.white_to_move else BLACK_KING_SIDE):
             self.king_side_castle_moves(row, col, moves)
         # queen side castle
-        if (self.white_to_move and self.current_castle_rights.wqs == True) or (
-                not self.white_to_move and self.current_castle_rights.bqs == True):
+        if self.castle_rights & (WHITE_QUEEN_SIDE if self.white_to_move else BLACK_QUEEN_SIDE):
             self.queen_side_castle_moves(row, col, moves)
 
     # gets all possible king side castle moves helps get_castle_moves
     def king_side_castle_moves(self, row, col, moves):
         # if the squares the king travels are empty and are not under attack
-        if self.board[row][col + 1] == '--' and self.board[row][col + 2] == '--':
+        sq = row * 8 + col
+        if not self.occupied & (0b11 << (sq + 1)):
             if not self.square_under_attack(row, col + 1) and not self.square_under_attack(row, col + 2):
-                moves.append(Move((row, col), (row, col + 2), self.board, is_castle=True))
+                moves.append(sq | (sq + 2) << 6 | MOVE_CASTLE)
 
     # gets all possible queen side castle moves helps get_castle_moves
     def queen_side_castle_moves(self, row, col, moves):
         # if the squares the king travels are empty and are not under attack
-        if self.board[row][col - 1] == '--' and self.board[row][col - 2] == '--' and self.board[row][col - 3] == '--':
+        sq = row * 8 + col
+        if not self.occupied & (0b111 << (sq - 3)):
             if not self.square_under_attack(row, col - 1) and not self.square_under_attack(row, col - 2):
-                moves.append(Move((row, col), (row, col - 2), self.board, is_castle=True))
+                moves.append(sq | (sq - 2) << 6 | MOVE_CASTLE)
 
-    def move_value(self, move):
-        capture_value = piece_points[move.piece_captured[1]] if move.piece_captured != '--' else 0
-        threatened_penalty = -piece_points[move.piece_moved[1]] // 10 if self.square_under_attack(move.end_row, move.end_col) else 0
-        return capture_value + threatened_penalty
-
-# stores castling rights
-class CastleRights:
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
-
-
-# creates Move object
+# readable view of a packed move, only used by the gui and for printing since the search works on ints
 class Move:
+    __slots__ = ('move', 'start_row', 'start_col', 'end_row', 'end_col', 'piece_moved', 'piece_captured',
+                 'is_pawn_promotion', 'promotion_piece', 'is_enpassant', 'is_castle')
     rank_to_row = {'1': 7, '2': 6, '3': 5, '4': 4,
                    '5': 3, '6': 2, '7': 1, '8': 0}
     row_to_rank = {v: k for k, v in rank_to_row.items()}
@@ -471,24 +1172,22 @@ class Move:
                    'e': 4, 'f': 5, 'g': 6, 'h': 7}
     col_to_file = {v: k for k, v in file_to_col.items()}
 
-    def __init__(self, start_sq, end_sq, board, is_enpassant=False, is_castle=False):
-        # stores start position, end position, piece moved, piece captured, and move id
-        self.start_row = start_sq[0]
-        self.start_col = start_sq[1]
-        self.end_row = end_sq[0]
-        self.end_col = end_sq[1]
-        self.piece_moved = board[self.start_row][self.start_col]
-        self.piece_captured = board[self.end_row][self.end_col]
-        self.move_id = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
+    # takes the packed move with the piece codes of the piece moved and the piece on its end square
+    def __init__(self, move, piece_moved, piece_captured):
+        self.move = move
+        self.start_row, self.start_col = divmod(move & 63, 8)
+        self.end_row, self.end_col = divmod(move >> 6 & 63, 8)
+        self.piece_moved = PIECE_NAMES[piece_moved]
+        self.piece_captured = PIECE_NAMES[piece_captured]
         # attribute is True if the move is a pawn promotion
-        self.is_pawn_promotion = ((self.piece_moved == 'wp' and self.end_row == 0) or (
-                self.piece_moved == 'bp' and self.end_row == 7))
+        self.is_pawn_promotion = bool(move & MOVE_PROMOTION)
+        self.promotion_piece = PROMOTION_PIECES[move >> 12 & 3] if self.is_pawn_promotion else 'Q'
         # attribute is True if the move is enpassant
-        self.is_enpassant = is_enpassant
+        self.is_enpassant = move >> 12 == 1
         if self.is_enpassant:
             self.piece_captured = 'wp' if self.piece_moved == 'bp' else 'bp'
         # attribute is true is the move is a castle
-        self.is_castle = is_castle
+        self.is_castle = move >> 12 == 2
 
     # overrides print method and prints move in chess notation
     def __str__(self) -> str:
@@ -510,8 +1209,12 @@ class Move:
     def get_rank_file(self, row, col) -> str:
         return self.col_to_file[col] + self.row_to_rank[row]
 
-    # overrides == operator to work for the move object
+    # gets the move in long algebraic notation as used by uci, like e2e4 or e7e8q
+    def get_uci(self) -> str:
+        return move_to_uci(self.move)
+
+    # overrides == operator to work for views and packed moves
     def __eq__(self, other) -> bool:
         if isinstance(other, Move):
-            return self.move_id == other.move_id
-        return False
+            return self.move == other.move
+        return self.move == other
@@ -1,7 +1,7 @@
 import pygame as p
-from multiprocessing import Process, Queue
 from Chess import ChessEngine
 from Chess import ChessAi
+from Chess import ChessWorker
 
 
 # global variables
@@ -9,14 +9,55 @@ WIDTH = HEIGHT = 512
 DIMENSION = 8
 SQ_SIZE = WIDTH // DIMENSION
 MAX_FPS = 15
+# seconds the ai may think per move for each difficulty
+EASY_TIME = 1.0
+HARD_TIME = 3.0
+# number of long lived processes searching each ai move, more than one searches lazy smp style
+AI_WORKERS = 1
+# search the expected reply while the human thinks, a correct guess keeps the search going
+PONDER = True
 COLORS = [p.Color("white"), p.Color("dark gray")]
 IMAGES = {}
+# the empty board, drawn once and copied from instead of drawing the squares every frame
+BOARD_IMAGE = None
+# translucent squares for the selected piece, where it can move and the last move, made once
+HIGHLIGHTS = {}
+FONTS = {}
+# events telling the window was uncovered or restored and its contents need drawing again
+EXPOSE_EVENTS = (p.VIDEOEXPOSE, p.WINDOWEXPOSED)
 
 
 def load_images():
+    global BOARD_IMAGE
     pieces = ['wp', 'wR', 'wN', 'wB', 'wQ', 'wK', 'bp', 'bR', 'bN', 'bB', 'bQ', 'bK']
     for piece in pieces:
         IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"), (SQ_SIZE, SQ_SIZE))
+    BOARD_IMAGE = p.Surface((WIDTH, HEIGHT))
+    for i in range(DIMENSION):
+        for j in range(DIMENSION):
+            color = COLORS[((i + j) % 2)]
+            p.draw.rect(BOARD_IMAGE, color, p.Rect(j * SQ_SIZE, i * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    for name, color, alpha in (('selected', 'yellow', 100), ('target', 'light green', 100),
+                               ('last move', 'dark blue', 50)):
+        s = p.Surface((SQ_SIZE, SQ_SIZE))
+        s.set_alpha(alpha)
+        s.fill(p.Color(color))
+        HIGHLIGHTS[name] = s
+
+
+# fonts are slow to look up so each size is made once
+def get_font(size):
+    if size not in FONTS:
+        FONTS[size] = p.font.SysFont("Bookman Old Style", size, True, False)
+    return FONTS[size]
+
+
+# end squares of the valid moves by start square, so the targets of a selected piece are one lookup
+def moves_by_square(valid_moves) -> dict:
+    targets = {}
+    for move in valid_moves:
+        targets.setdefault(move & 63, []).append(move >> 6 & 63)
+    return targets
 
 
 def main():
@@ -26,6 +67,7 @@ def main():
     screen.fill(p.Color("white"))
     game_state = ChessEngine.GameState()
     valid_moves = game_state.get_valid_moves()
+    move_targets = moves_by_square(valid_moves)
     move_made = False
     animate = False
     load_images()
@@ -35,14 +77,24 @@ def main():
     game_over = False
     player_w, player_b, difficulty_w, difficulty_b = show_menu(screen, clock)
     ai_thinking = False
-    move_finder_process = None
+    # the search processes start once and keep their tables warm for the whole game
+    search_pool = ChessWorker.SearchPool(AI_WORKERS) if not (player_w and player_b) else None
     move_undone = False
+    # what every square showed in the last frame, only squares that look different are drawn again and
+    # None makes a square draw, the same for the game over text
+    drawn = [None] * 64
+    text_drawn = None
+    # set when the window needs all of it sent to the display again
+    full_redraw = False
 
     while running:
         human_turn = (game_state.white_to_move and player_w) or (not game_state.white_to_move and player_b)
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
+            elif e.type in EXPOSE_EVENTS:
+                drawn = [None] * 64
+                full_redraw = True
             elif e.type == p.MOUSEBUTTONDOWN:
                 if not game_over:
                     location = p.mouse.get_pos()
@@ -55,15 +107,15 @@ def main():
                         sq_selected = (row, col)
                         player_clicks.append(sq_selected)
                     if len(player_clicks) == 2 and human_turn:
-                        move = ChessEngine.Move(player_clicks[0], player_clicks[1], game_state.board)
-                        print(move)
-                        for i in range(len(valid_moves)):
-                            if move == valid_moves[i]:
-                                game_state.make_move(valid_moves[i])
-                                move_made = True
-                                animate = True
-                                sq_selected = ()
-                                player_clicks = []
+                        start = player_clicks[0][0] * 8 + player_clicks[0][1]
+                        move = game_state.find_move(start, row * 8 + col)
+                        if move is not None:
+                            print(game_state.move_view(move))
+                            game_state.make_move(move)
+                            move_made = True
+                            animate = True
+                            sq_selected = ()
+                            player_clicks = []
                         if not move_made:
                             player_clicks = [sq_selected]
             elif e.type == p.KEYDOWN:
@@ -72,21 +124,22 @@ def main():
                     move_made = True
                     animate = False
                     game_over = False
-                    if ai_thinking:
-                        move_finder_process.terminate()
-                        ai_thinking = False
+                    if search_pool is not None:
+                        search_pool.cancel()
+                    ai_thinking = False
                     move_undone = True
                 if e.key == p.K_r:
                     game_state = ChessEngine.GameState()
                     valid_moves = game_state.get_valid_moves()
+                    move_targets = moves_by_square(valid_moves)
                     sq_selected = ()
                     player_clicks = []
                     move_made = False
                     animate = False
                     game_over = False
-                    if ai_thinking:
-                        move_finder_process.terminate()
-                        ai_thinking = False
+                    if search_pool is not None:
+                        search_pool.cancel()
+                    ai_thinking = False
                     move_undone = True
                 if e.key == p.K_q:
                     game_state.resign = True
@@ -94,94 +147,121 @@ def main():
         if not game_over and not human_turn and not move_undone:
             if not ai_thinking:
                 ai_thinking = True
-                print("thinking...")
-                return_queue = Queue()
-                move_finder_process = Process(target=ChessAi.get_negamax_move,
-                                              args=(game_state, valid_moves, return_queue, difficulty_w if not player_w else difficulty_b))
-                move_finder_process.start()
-            if not move_finder_process.is_alive():
-                ai_move = return_queue.get()
+                if search_pool.start_search(game_state, difficulty_w if not player_w else difficulty_b):
+                    print("ponder hit, thinking...")
+                else:
+                    print("thinking...")
+            if search_pool.poll():
+                ai_move = game_state.parse_uci_move(search_pool.best_move) if search_pool.best_move else None
                 if ai_move is None:
                     game_state.make_move(ChessAi.get_random_move(valid_moves))
                 else:
                     game_state.make_move(ai_move)
+                    if PONDER:
+                        search_pool.ponder(game_state)
                 move_made = True
                 animate = True
                 ai_thinking = False
 
         if move_made:
             if animate:
-                animate_move(game_state.move_log[-1], screen, game_state.board, clock)
+                animate_move(game_state.last_move_view(), screen, game_state.board, clock)
+                drawn = [None] * 64
             valid_moves = game_state.get_valid_moves()
+            move_targets = moves_by_square(valid_moves)
             move_made = False
             animate = False
             move_undone = False
 
-        draw_gamestate(screen, game_state, valid_moves, sq_selected, game_state.move_log)
-        if game_state.checkmate:
-            game_over = True
-            if game_state.white_to_move:
-                draw_text(screen, "Black Wins!")
-            else:
-                draw_text(screen, "White Wins!")
+        text = None
+        if game_state.checkmate or game_state.resign:
+            text = "Black Wins!" if game_state.white_to_move else "White Wins!"
         elif game_state.stalemate:
+            text = "Stalemate"
+        if text is not None and not game_over:
             game_over = True
-            draw_text(screen, "Stalemate")
-        elif game_state.resign:
-            game_over = True
-            if game_state.white_to_move:
-                draw_text(screen, "Black Wins!")
-            else:
-                draw_text(screen, "White Wins!")
-
+            # a ponder search has no time limit and would keep the workers busy until the window is closed
+            if search_pool is not None:
+                search_pool.cancel()
+            ai_thinking = False
+        # the text covers several squares, taking it away draws them all again
+        if text_drawn is not None and text != text_drawn:
+            drawn = [None] * 64
+        rects = draw_gamestate(screen, game_state, move_targets, sq_selected, game_state.last_move_view(), drawn)
+        if text is not None and (rects or text != text_drawn):
+            rects.append(draw_text(screen, text))
+        text_drawn = text
+        # nothing is sent to the display while the position and selection stay the same
+        if full_redraw:
+            p.display.flip()
+            full_redraw = False
+        elif rects:
+            p.display.update(rects)
         clock.tick(MAX_FPS)
-        p.display.flip()
+
+    if search_pool is not None:
+        search_pool.close()
 
 
 def mouse_events():
     pass
 
 
-# highlights square clicked on, all valid moves from that square, and last move made
-def highlight_square(screen, game_state, valid_moves, sq_selected, move_log):
-    if sq_selected != ():
-        row, col = sq_selected
-        if game_state.board[row][col][0] == ('w' if game_state.white_to_move else 'b'):
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(100)
-            s.fill(p.Color('yellow'))
-            screen.blit(s, (col * SQ_SIZE, row * SQ_SIZE))
-            s.fill(p.Color('light green'))
-            for move in valid_moves:
-                if move.start_row == row and move.start_col == col:
-                    screen.blit(s, (move.end_col * SQ_SIZE, move.end_row * SQ_SIZE))
-    if len(move_log) == 0:
-        return
-    else:
-        s = p.Surface((SQ_SIZE, SQ_SIZE))
-        s.set_alpha(50)
-        s.fill(p.Color('dark blue'))
-        last_move = move_log[-1]
-        screen.blit(s, (last_move.start_col * SQ_SIZE, last_move.start_row * SQ_SIZE))
-        screen.blit(s, (last_move.end_col * SQ_SIZE, last_move.end_row * SQ_SIZE))
-
-
-# draws current game state
-def draw_gamestate(screen, game_state, valid_moves, sq_selected, move_log):
-    draw_board(screen)
-    highlight_square(screen, game_state, valid_moves, sq_selected, move_log)
-    draw_pieces(screen, game_state.board)
+# what a square shows: its piece and the highlights on it, in the order they are drawn
+def square_look(game_state, sq, targets, selected, last_move):
+    highlights = []
+    if sq == selected:
+        highlights.append('selected')
+    elif sq in targets:
+        highlights.append('target')
+    if sq in last_move:
+        highlights.append('last move')
+    return game_state.squares[sq], tuple(highlights)
 
 
-# draws squares helps draw_gamestate
+# draws the squares that look different from what drawn says they showed, drawn is updated in place,
+# returns the rectangles drawn on
+def draw_gamestate(screen, game_state, move_targets, sq_selected, last_move, drawn) -> list:
+    selected = None
+    targets = ()
+    if sq_selected != ():
+        row, col = sq_selected
+        sq = row * DIMENSION + col
+        # only a piece of the side to move is highlighted with its moves
+        if ChessEngine.PIECE_NAMES[game_state.squares[sq]][0] == ('w' if game_state.white_to_move else 'b'):
+            selected = sq
+            targets = move_targets.get(sq, ())
+    last_squares = ()
+    if last_move is not None:
+        last_squares = (last_move.start_row * DIMENSION + last_move.start_col,
+                        last_move.end_row * DIMENSION + last_move.end_col)
+    rects = []
+    for sq in range(DIMENSION * DIMENSION):
+        look = square_look(game_state, sq, targets, selected, last_squares)
+        if drawn[sq] != look:
+            drawn[sq] = look
+            rects.append(draw_square(screen, sq, look))
+    return rects
+
+
+# draws one square from the board image with its highlights and piece, returns its rectangle
+def draw_square(screen, sq, look):
+    piece, highlights = look
+    rect = p.Rect(sq % DIMENSION * SQ_SIZE, sq // DIMENSION * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+    screen.blit(BOARD_IMAGE, rect, rect)
+    for name in highlights:
+        screen.blit(HIGHLIGHTS[name], rect)
+    if piece != ChessEngine.EMPTY:
+        screen.blit(IMAGES[ChessEngine.PIECE_NAMES[piece]], rect)
+    return rect
+
+
+# draws squares helps animate_move
 def draw_board(screen):
-    for i in range(DIMENSION):
-        for j in range(DIMENSION):
-            color = COLORS[((i + j) % 2)]
-            p.draw.rect(screen, color, p.Rect(j * SQ_SIZE, i * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    screen.blit(BOARD_IMAGE, (0, 0))
 
 
-# draws pieces on squares helps draw_gamestate
+# draws pieces on squares helps animate_move
 def draw_pieces(screen, board):
     for i in range(DIMENSION):
         for j in range(DIMENSION):
@@ -210,38 +290,41 @@ def animate_move(move, screen, board, clock):
         clock.tick(60)
 
 
-# draw win and stalemate statements
+# draw win and stalemate statements, returns the rectangle drawn on
 def draw_text(screen, text):
-    font = p.font.SysFont("Bookman Old Style", 32, True, False)
-    text_obj = font.render(text, 0, p.Color("black"))
-    text_loc = p.Rect(0, 0, WIDTH, HEIGHT).move(WIDTH / 2 - text_obj.get_width() / 2,
-                                                HEIGHT / 2 - text_obj.get_height() / 2)
+    text_obj = get_font(32).render(text, 0, p.Color("black"))
+    text_loc = text_obj.get_rect(center=(WIDTH // 2, HEIGHT // 2))
     screen.blit(text_obj, text_loc)
+    return text_loc
 
 
 def show_menu(screen, clock):
-    font = p.font.SysFont("Bookman Old Style", 16, True, False)
+    font = get_font(16)
     player_w, player_b = False, False
     selected_option = None
 
-    while selected_option is None:
-        screen.fill(p.Color("white"))
-        text_1 = font.render("1>> Human vs Human", True, p.Color("black"))
-        text_2 = font.render("2>> Easy White AI vs Human", True, p.Color("black"))
-        text_3 = font.render("3>> Hard White AI vs Human", True, p.Color("black"))
-        text_4 = font.render("4>> Human vs Easy Black AI", True, p.Color("black"))
-        text_5 = font.render("5>> Human vs Hard Black AI", True, p.Color("black"))
-        screen.blit(text_1, (WIDTH / 2 - text_1.get_width() / 2, HEIGHT / 3 + (text_1.get_height() + 10)))
-        screen.blit(text_2, (WIDTH / 2 - text_2.get_width() / 2, HEIGHT / 3 + 2*(text_2.get_height() + 10)))
-        screen.blit(text_3, (WIDTH / 2 - text_3.get_width() / 2, HEIGHT / 3 + 3*(text_3.get_height() + 10)))
-        screen.blit(text_4, (WIDTH / 2 - text_4.get_width() / 2, HEIGHT / 3 + 4*(text_4.get_height() + 10)))
-        screen.blit(text_5, (WIDTH / 2 - text_5.get_width() / 2, HEIGHT / 3 + 5*(text_5.get_height() + 10)))
+    # the menu doesn't change so it is drawn once
+    screen.fill(p.Color("white"))
+    text_1 = font.render("1>> Human vs Human", True, p.Color("black"))
+    text_2 = font.render("2>> Easy White AI vs Human", True, p.Color("black"))
+    text_3 = font.render("3>> Hard White AI vs Human", True, p.Color("black"))
+    text_4 = font.render("4>> Human vs Easy Black AI", True, p.Color("black"))
+    text_5 = font.render("5>> Human vs Hard Black AI", True, p.Color("black"))
+    screen.blit(text_1, (WIDTH / 2 - text_1.get_width() / 2, HEIGHT / 3 + (text_1.get_height() + 10)))
+    screen.blit(text_2, (WIDTH / 2 - text_2.get_width() / 2, HEIGHT / 3 + 2*(text_2.get_height() + 10)))
+    screen.blit(text_3, (WIDTH / 2 - text_3.get_width() / 2, HEIGHT / 3 + 3*(text_3.get_height() + 10)))
+    screen.blit(text_4, (WIDTH / 2 - text_4.get_width() / 2, HEIGHT / 3 + 4*(text_4.get_height() + 10)))
+    screen.blit(text_5, (WIDTH / 2 - text_5.get_width() / 2, HEIGHT / 3 + 5*(text_5.get_height() + 10)))
+
+    p.display.flip()
 
-        p.display.flip()
+    while selected_option is None:
         clock.tick(30)
 
         for e in p.event.get():
-            if e.type == p.KEYDOWN:
+            if e.type in EXPOSE_EVENTS:
+                p.display.flip()
+            elif e.type == p.KEYDOWN:
                 if e.key == p.K_1:
                     player_w = True
                     player_b = True
@@ -251,26 +334,26 @@ def show_menu(screen, clock):
                 elif e.key == p.K_2:
                     player_w = False
                     player_b = True
-                    difficulty_w = 2
+                    difficulty_w = EASY_TIME
                     difficulty_b = 0
                     selected_option = "White: AI"
                 elif e.key == p.K_3:
                     player_w = False
                     player_b = True
-                    difficulty_w = 3
+                    difficulty_w = HARD_TIME
                     difficulty_b = 0
                     selected_option = "Black: Human"
                 elif e.key == p.K_4:
                     player_w = True
                     player_b = False
                     difficulty_w = 0
-                    difficulty_b = 2
+                    difficulty_b = EASY_TIME
                     selected_option = "Black: AI"
                 elif e.key == p.K_5:
                     player_w = True
                     player_b = False
                     difficulty_w = 0
-                    difficulty_b = 3
+                    difficulty_b = HARD_TIME
                     selected_option = "Black: AI"
             elif e.type == p.QUIT:
                 p.quit()
@@ -0,0 +1,313 @@
+import argparse
+import math
+import os
+import random
+import time
+from multiprocessing import Pool
+from queue import Queue
+from Chess import ChessEngine
+from Chess import ChessAi
+
+# openings played when no file is given, as san moves from the start position, each one is played twice
+# with the colours swapped so neither engine gets the better side of an opening
+OPENINGS = [
+    'e4 e5 Nf3 Nc6 Bb5 a6',
+    'e4 e5 Nf3 Nc6 Bc4 Bc5',
+    'e4 e5 Nf3 Nf6',
+    'e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6',
+    'e4 c5 Nc3 Nc6',
+    'e4 e6 d4 d5 Nc3',
+    'e4 c6 d4 d5 e5',
+    'e4 d5 exd5 Qxd5',
+    'd4 d5 c4 e6 Nc3 Nf6',
+    'd4 d5 c4 c6 Nf3 Nf6',
+    'd4 d5 c4 dxc4',
+    'd4 Nf6 c4 g6 Nc3 Bg7',
+    'd4 Nf6 c4 e6 Nc3 Bb4',
+    'd4 f5 g3 Nf6',
+    'c4 e5 Nc3 Nf6',
+    'Nf3 d5 g3 Nf6 Bg2',
+]
+# search settings of a side, anything else in a settings string sets the ChessAi global of that name
+DEFAULT_SETTINGS = {'depth': 4, 'time': None, 'nodes': None, 'hash': ChessAi.TT_SIZE_MB}
+# games still going after this many plies are scored as draws
+MAX_PLIES = 300
+RESULT_SCORES = {'1-0': 1.0, '0-1': 0.0, '1/2-1/2': 0.5}
+
+
+# parses settings like depth=5,time=0.5,use_book=0 into a dict, numbers and true/false are converted
+def parse_settings(text) -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    for item in filter(None, text.split(',')):
+        name, _, value = item.partition('=')
+        name = name.strip().lower()
+        value = value.strip()
+        if name not in settings and not hasattr(ChessAi, name.upper()):
+            raise ValueError('unknown search setting ' + name)
+        if value.lower() in ('true', 'false', 'yes', 'no', 'on', 'off'):
+            settings[name] = value.lower() in ('true', 'yes', 'on')
+        elif value.lower() in ('', 'none'):
+            settings[name] = None
+        else:
+            settings[name] = float(value) if '.' in value else int(value)
+    return settings
+
+
+# short name of an engine for the pgn and the summary, its settings that differ from the defaults
+def describe_settings(label, settings) -> str:
+    changed = [f'{name}={value}' for name, value in settings.items() if DEFAULT_SETTINGS.get(name, '') != value]
+    return label + (' (' + ', '.join(changed) + ')' if changed else '')
+
+
+# reads openings from a file, one per line, either an epd or fen position or san moves from the start
+def load_openings(path) -> list:
+    openings = []
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if '/' in line.split()[0]:
+                openings.append((ChessEngine.parse_epd(line)[0], ''))
+            else:
+                openings.append((ChessEngine.START_FEN, line))
+    return openings
+
+
+# sets up an opening, returns the game state and the san of the moves played to reach it
+def play_opening(opening) -> tuple:
+    fen, moves = opening
+    gs = ChessEngine.GameState(fen)
+    sans = []
+    for san in moves.split():
+        move = gs.parse_san(san)
+        if move is None:
+            raise ValueError('illegal opening move ' + san + ' in ' + moves)
+        sans.append(gs.get_san(move))
+        gs.make_move(move)
+    return gs, sans
+
+
+# neither side can mate: bare kings or a lone minor piece against a king
+def insufficient_material(gs) -> bool:
+    pieces = bin(gs.occupied).count('1')
+    if pieces == 2:
+        return True
+    if pieces != 3:
+        return False
+    minors = (gs.bitboards[ChessEngine.WN] | gs.bitboards[ChessEngine.WB] |
+              gs.bitboards[ChessEngine.BN] | gs.bitboards[ChessEngine.BB])
+    return bool(minors)
+
+
+# the result and how the game ended if it is over, None while it goes on
+def game_over(gs, valid_moves, plies):
+    if not valid_moves:
+        if gs.in_check():
+            return ('0-1' if gs.white_to_move else '1-0'), 'checkmate'
+        return '1/2-1/2', 'stalemate'
+    if gs.halfmove_clock >= 100:
+        return '1/2-1/2', 'fifty move rule'
+    if gs.is_repetition(2):
+        return '1/2-1/2', 'threefold repetition'
+    if insufficient_material(gs):
+        return '1/2-1/2', 'insufficient material'
+    if plies >= MAX_PLIES:
+        return '1/2-1/2', 'move limit'
+    return None
+
+
+# points the ChessAi globals at one side's settings before it searches
+def apply_settings(settings):
+    for name, value in settings.items():
+        if name not in DEFAULT_SETTINGS:
+            setattr(ChessAi, name.upper(), value)
+
+
+# writes a finished game as pgn, with the way it ended as a comment before the result
+def format_pgn(tags, start_fen, sans, result, reason) -> str:
+    gs = ChessEngine.GameState(start_fen)
+    lines = [f'[{name} "{value}"]' for name, value in tags.items()]
+    if start_fen != ChessEngine.START_FEN:
+        lines += ['[SetUp "1"]', f'[FEN "{start_fen}"]']
+    lines.append('')
+    tokens = []
+    number = gs.fullmove_number
+    white = gs.white_to_move
+    for i, san in enumerate(sans):
+        if white:
+            tokens.append(f'{number}.')
+        elif i == 0:
+            tokens.append(f'{number}...')
+        tokens.append(san)
+        if not white:
+            number += 1
+        white = not white
+    tokens += ['{' + reason + '}', result]
+    line = ''
+    for token in tokens:
+        if len(line) + len(token) + 1 > 80:
+            lines.append(line)
+            line = token
+        else:
+            line = line + ' ' + token if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+# plays one game in a pool process, returns the result with the moves as pgn and the search work of each
+# side as [moves searched, sum of depths, nodes, seconds]
+def play_game(job) -> dict:
+    game_id, opening, labels, sides = job
+    random.seed(game_id)
+    gs, sans = play_opening(opening)
+    start_fen = opening[0]
+    # each side keeps its own transposition table for the whole game
+    tables = [ChessAi.TranspositionTable(settings['hash']) for settings in sides]
+    work = [[0, 0, 0, 0.0], [0, 0, 0, 0.0]]
+    plies = 0
+    while True:
+        valid_moves = gs.get_valid_moves()
+        ending = game_over(gs, valid_moves, plies)
+        if ending is not None:
+            break
+        side = 0 if gs.white_to_move else 1
+        settings = sides[side]
+        apply_settings(settings)
+        ChessAi.tt = tables[side]
+        queue = Queue()
+        start = time.perf_counter()
+        ChessAi.get_negamax_move(gs, valid_moves, queue, settings['depth'], settings['time'], settings['nodes'])
+        move = queue.get()
+        elapsed = time.perf_counter() - start
+        if move is None:
+            move = valid_moves[0]
+        if ChessAi.completed_depth:
+            work[side][0] += 1
+            work[side][1] += ChessAi.completed_depth
+            work[side][2] += ChessAi.nodes + ChessAi.q_nodes
+            work[side][3] += elapsed
+        sans.append(gs.get_san(move))
+        gs.make_move(move)
+        plies += 1
+    result, reason = ending
+    tags = {'Event': 'Engine match', 'Site': '?', 'Date': time.strftime('%Y.%m.%d'), 'Round': str(game_id + 1),
+            'White': labels[0], 'Black': labels[1], 'Result': result, 'PlyCount': str(len(sans))}
+    return {'game_id': game_id, 'result': result, 'reason': reason, 'work': work,
+            'pgn': format_pgn(tags, start_fen, sans, result, reason)}
+
+
+# elo difference of a score between 0 and 1, infinite for a clean sweep
+def elo_difference(score) -> float:
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+# elo estimate of the first engine with the half width of its 95% confidence interval, taken from the
+# spread of the per game scores, the interval is kept half a game inside 0 and 1 so a short match gets a
+# wide but finite error bar
+def elo_estimate(wins, draws, losses) -> tuple:
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    limit = 0.5 / games
+    low = elo_difference(min(max(score - margin, limit), 1 - limit))
+    high = elo_difference(min(max(score + margin, limit), 1 - limit))
+    return elo_difference(score), (high - low) / 2
+
+
+# plays the match on a process pool and streams every game to the pgn file as it finishes, engine a plays
+# white in the even games and black in the odd ones, returns the wins, draws and losses of engine a
+def run_match(settings_a, settings_b, openings, games, processes=None, pgn_path=None, output=print) -> tuple:
+    if games < 1:
+        raise ValueError('a match needs at least one game')
+    labels = (describe_settings('A', settings_a), describe_settings('B', settings_b))
+    # a global set by only one side is set back to its default when the other searches
+    settings_a, settings_b = dict(settings_a), dict(settings_b)
+    for name in set(settings_a) | set(settings_b):
+        if name not in DEFAULT_SETTINGS:
+            settings_a.setdefault(name, getattr(ChessAi, name.upper()))
+            settings_b.setdefault(name, getattr(ChessAi, name.upper()))
+    jobs = []
+    for game_id in range(games):
+        opening = openings[game_id // 2 % len(openings)]
+        if game_id % 2 == 0:
+            jobs.append((game_id, opening, labels, (settings_a, settings_b)))
+        else:
+            jobs.append((game_id, opening, labels[::-1], (settings_b, settings_a)))
+    # the side a worked as, [moves searched, sum of depths, nodes, seconds] for a and b
+    work = [[0, 0, 0, 0.0], [0, 0, 0, 0.0]]
+    wins = draws = losses = 0
+    pgn = open(pgn_path, 'w') if pgn_path is not None else None
+    start = time.perf_counter()
+    with Pool(processes) as pool:
+        for finished, game in enumerate(pool.imap_unordered(play_game, jobs), 1):
+            a_is_white = game['game_id'] % 2 == 0
+            score = RESULT_SCORES[game['result']]
+            if not a_is_white:
+                score = 1 - score
+            if score == 1:
+                wins += 1
+            elif score == 0:
+                losses += 1
+            else:
+                draws += 1
+            for engine, side in ((0, 0), (1, 1)) if a_is_white else ((0, 1), (1, 0)):
+                for i in range(4):
+                    work[engine][i] += game['work'][side][i]
+            if pgn is not None:
+                pgn.write(game['pgn'])
+                pgn.flush()
+            output(f'game {finished}/{games}: {game["result"]} by {game["reason"]}, '
+                   f'A {wins} - {losses} - {draws}')
+    if pgn is not None:
+        pgn.close()
+    elapsed = time.perf_counter() - start
+
+    elo, margin = elo_estimate(wins, draws, losses)
+    output(f'Score of {labels[0]} vs {labels[1]}: {wins} - {losses} - {draws} '
+           f'[{(wins + draws / 2) / games:.3f}] {games} games')
+    output(f'Elo difference: {elo:+.1f} +/- {margin:.1f}')
+    for label, (moves, depths, nodes, seconds) in zip(labels, work):
+        output(f'{label}: mean depth {depths / moves if moves else 0:.2f}, '
+               f'{int(nodes / seconds) if seconds else 0} nodes per second')
+    output(f'{games} games in {elapsed:.1f}s, {games * 60 / elapsed:.1f} games per minute')
+    return wins, draws, losses
+
+
+# argparse type for counts that have to be at least one
+def positive_int(text) -> int:
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError('must be at least 1: ' + text)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play a headless engine against engine match.')
+    parser.add_argument('--a', default='', help='search settings of engine A, like depth=5,time=0.5')
+    parser.add_argument('--b', default='', help='search settings of engine B, like depth=4,use_book=false')
+    parser.add_argument('--games', type=positive_int, help='games to play, two per opening by default')
+    parser.add_argument('--openings', help='file with one opening per line, an epd or san moves')
+    parser.add_argument('--processes', type=positive_int, default=os.cpu_count(), help='games played at once')
+    parser.add_argument('--pgn', default='match.pgn', help='file the games are written to')
+    args = parser.parse_args()
+
+    try:
+        settings_a, settings_b = parse_settings(args.a), parse_settings(args.b)
+    except ValueError as error:
+        parser.error(str(error))
+    openings = load_openings(args.openings) if args.openings else [(ChessEngine.START_FEN, moves)
+                                                                   for moves in OPENINGS]
+    for opening in openings:
+        play_opening(opening)
+    games = args.games if args.games is not None else 2 * len(openings)
+    run_match(settings_a, settings_b, openings, games, args.processes, args.pgn)
+
+
+if __name__ == '__main__':
+    main()
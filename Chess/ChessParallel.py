@@ -0,0 +1,107 @@
+from multiprocessing import shared_memory
+from Chess import ChessAi
+
+
+# every entry is two 64 bit words, the key xored with the data and the data itself
+ENTRY_BYTES = 16
+# data word layout: depth + 1 in bits 0-7, bound type in 8-9, score + SCORE_OFFSET in 10-30,
+# move id + 1 in 31-46 and search age in 47-54
+SCORE_OFFSET = 1 << 20
+# helpers with an odd id skip depth 1 so the workers are spread over neighbouring depths
+HELPER_DEPTH_SKIP = 1
+
+
+# transposition table in shared memory that every search process reads and writes without locks,
+# a torn write from two processes leaves an entry whose key check fails so it is simply missed
+class SharedTranspositionTable:
+    def __init__(self, size_mb=ChessAi.TT_SIZE_MB, name=None):
+        if name is None:
+            entries = 2
+            while entries * 2 * ENTRY_BYTES <= size_mb * 1024 * 1024:
+                entries *= 2
+            # one more entry's worth of bytes after the table holds the search age
+            self.memory = shared_memory.SharedMemory(create=True, size=(entries + 1) * ENTRY_BYTES)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            entries = 2
+            while entries * 2 * ENTRY_BYTES <= self.memory.size:
+                entries *= 2
+            self.owner = False
+        self.name = self.memory.name
+        self.size = entries
+        self.mask = entries - 2
+        self.words = self.memory.buf.cast('Q')
+        # the age lives in shared memory so every process compares the same one, this is the copy read at
+        # the start of the search
+        self.age_word = 2 * entries
+        self.age = self.words[self.age_word]
+        # hit rate counters, kept per process
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    # returns (depth, flag, score, move id) stored for the key or None
+    def probe(self, key):
+        self.probes += 1
+        words = self.words
+        i = (key & self.mask) << 1
+        data = words[i + 1]
+        if not data or words[i] ^ data != key:
+            i += 2
+            data = words[i + 1]
+            if not data or words[i] ^ data != key:
+                return None
+        self.hits += 1
+        move_id = (data >> 31) & 0xFFFF
+        return ((data & 0xFF) - 1, (data >> 8) & 0x3, ((data >> 10) & 0x1FFFFF) - SCORE_OFFSET,
+                move_id - 1 if move_id else None)
+
+    # stores a search result, keeping the deeper or more recent entry in the first slot of the pair, a result
+    # for a position already stored deeper in this search is dropped, like in ChessAi.TranspositionTable
+    def store(self, key, depth, flag, score, move_id):
+        self.stores += 1
+        words = self.words
+        i = (key & self.mask) << 1
+        data = words[i + 1]
+        if data and words[i] ^ data != key and (words[i + 2] ^ words[i + 3] == key and words[i + 3] or (
+                data & 0xFF) - 1 > depth and (data >> 47) & 0xFF == self.age):
+            i += 2
+            data = words[i + 1]
+        if data and words[i] ^ data == key and (data & 0xFF) - 1 > depth and (data >> 47) & 0xFF == self.age:
+            return
+        if data and words[i] ^ data != key:
+            self.overwrites += 1
+        data = ((depth + 1) | flag << 8 | (score + SCORE_OFFSET) << 10 |
+                (move_id + 1 if move_id is not None else 0) << 31 | self.age << 47)
+        words[i] = key ^ data
+        words[i + 1] = data
+
+    # marks existing entries as old so they are the first to be replaced, only the process that created the
+    # table moves the age on, the searching processes pick the new one up here when their search starts
+    def new_search(self):
+        if self.owner:
+            self.words[self.age_word] = (self.words[self.age_word] + 1) & 0xFF
+        self.age = self.words[self.age_word]
+
+    # fraction of probes that found their position
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    # fraction of slots in use, sampled from the start of the table
+    def usage(self) -> float:
+        sample = min(self.size, 2000)
+        return sum(1 for i in range(sample) if self.words[2 * i + 1]) / sample
+
+    # counters used to size the table for a memory budget
+    def stats(self) -> dict:
+        return {'size': self.size, 'probes': self.probes, 'hits': self.hits, 'hit_rate': self.hit_rate(),
+                'stores': self.stores, 'overwrites': self.overwrites, 'usage': self.usage()}
+
+    # detaches from the shared memory, the process that created it also frees it
+    def close(self):
+        self.words.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
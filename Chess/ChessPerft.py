@@ -0,0 +1,127 @@
+import argparse
+import time
+from multiprocessing import Pool
+from Chess import ChessEngine
+
+
+# standard perft positions with their known leaf counts for depth 1, 2, 3, ...
+REFERENCE_POSITIONS = [
+    ('start', ChessEngine.START_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624]),
+    ('position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487]),
+    ('position 6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+
+
+# counts the leaf nodes depth moves ahead, the last level is counted without making the moves
+def perft(gs, depth) -> int:
+    moves = gs.get_valid_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+# counts the leaf nodes below every root move, returns a list of (uci move, nodes)
+def divide(gs, depth) -> list:
+    results = []
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        results.append((ChessEngine.move_to_uci(move), perft(gs, depth - 1)))
+        gs.undo_move()
+    return results
+
+
+# counts the leaf nodes below one root move, run in a worker process by parallel_divide
+def divide_move(args) -> tuple:
+    fen, uci, depth = args
+    gs = ChessEngine.GameState(fen)
+    move = gs.parse_uci_move(uci)
+    if move is None:
+        raise ValueError('illegal move ' + uci + ' in ' + fen)
+    gs.make_move(move)
+    return uci, perft(gs, depth - 1)
+
+
+# same as divide but the root moves are split across a pool of processes
+def parallel_divide(fen, depth, processes) -> list:
+    gs = ChessEngine.GameState(fen)
+    jobs = [(fen, ChessEngine.move_to_uci(move), depth) for move in gs.get_valid_moves()]
+    with Pool(processes) as pool:
+        return pool.map(divide_move, jobs)
+
+
+# runs perft on a fen and returns (nodes, divide results, seconds), processes > 1 splits the root moves
+def run_perft(fen, depth, processes=1) -> tuple:
+    start = time.perf_counter()
+    if processes > 1 and depth > 1:
+        results = parallel_divide(fen, depth, processes)
+    else:
+        results = divide(ChessEngine.GameState(fen), depth) if depth > 1 else None
+    if results is None:
+        nodes = perft(ChessEngine.GameState(fen), depth)
+    else:
+        nodes = sum(count for uci, count in results)
+    return nodes, results, time.perf_counter() - start
+
+
+# checks the move generator against every reference position up to max_depth, skipping
+# depths whose known count is above max_nodes, returns True if every count matched
+def run_suite(max_depth=4, max_nodes=200000, processes=1, output=print) -> bool:
+    passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, counts in REFERENCE_POSITIONS:
+        for depth, expected in enumerate(counts[:max_depth], start=1):
+            if expected > max_nodes:
+                break
+            nodes, results, seconds = run_perft(fen, depth, processes)
+            total_nodes += nodes
+            total_time += seconds
+            status = 'ok' if nodes == expected else 'FAILED expected ' + str(expected)
+            passed = passed and nodes == expected
+            output(f'{name:<12} depth {depth}  {nodes:>10} nodes  {nodes_per_second(nodes, seconds):>9} nps  {status}')
+    output(f'total {total_nodes} nodes in {total_time:.2f}s, {nodes_per_second(total_nodes, total_time)} nps')
+    return passed
+
+
+# nodes per second for reporting, 0 when the time was too short to measure
+def nodes_per_second(nodes, seconds) -> int:
+    return int(nodes / seconds) if seconds > 0 else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count move generator leaf nodes and measure its speed.')
+    parser.add_argument('--fen', default=ChessEngine.START_FEN, help='position to count from')
+    parser.add_argument('--depth', type=int, default=4, help='number of plies to count')
+    parser.add_argument('--divide', action='store_true', help='print the count below every root move')
+    parser.add_argument('--suite', action='store_true', help='check the built in reference positions')
+    parser.add_argument('--max-nodes', type=int, default=200000,
+                        help='largest known count the suite will run')
+    parser.add_argument('--processes', type=int, default=1, help='split the root moves across processes')
+    args = parser.parse_args()
+
+    if args.suite:
+        passed = run_suite(args.depth, args.max_nodes, args.processes)
+        raise SystemExit(0 if passed else 1)
+    nodes, results, seconds = run_perft(args.fen, args.depth, args.processes)
+    if args.divide and results is not None:
+        for uci, count in sorted(results):
+            print(f'{uci}: {count}')
+    print(f'depth {args.depth}: {nodes} nodes in {seconds:.2f}s, {nodes_per_second(nodes, seconds)} nps')
+
+
+if __name__ == '__main__':
+    main()
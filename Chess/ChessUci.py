@@ -0,0 +1,207 @@
+import sys
+import threading
+import time
+from queue import Queue
+from Chess import ChessEngine
+from Chess import ChessAi
+
+ENGINE_NAME = 'Chess-Engine'
+ENGINE_AUTHOR = 'Chess-Engine authors'
+# share of the remaining clock spent on a move when the gui gives no moves to go
+DEFAULT_MOVES_TO_GO = 30
+# milliseconds kept back from every move for sending it to the gui
+MOVE_OVERHEAD = 50
+
+
+# score in uci notation, mates the search found don't store their length so it is taken from the
+# principal variation, which ends in the mate
+def uci_score(score, pv_plies) -> str:
+    if abs(score) >= ChessAi.CHECKMATE:
+        moves = (pv_plies + 1) // 2
+        return 'mate ' + str(moves if score > 0 else -moves)
+    if abs(score) > ChessAi.BITBASE_MATE - 256:
+        plies = ChessAi.BITBASE_MATE - abs(score) + 1
+        moves = (plies + 1) // 2
+        return 'mate ' + str(moves if score > 0 else -moves)
+    return 'cp ' + str(score)
+
+
+# seconds to think about a move from the go command's clock, None means no time limit
+def think_time(white_to_move, options):
+    if 'movetime' in options:
+        return max(options['movetime'] - MOVE_OVERHEAD, 1) / 1000
+    clock = options.get('wtime' if white_to_move else 'btime')
+    if clock is None:
+        return None
+    increment = options.get('winc' if white_to_move else 'binc', 0)
+    moves_to_go = options.get('movestogo', DEFAULT_MOVES_TO_GO)
+    budget = clock / moves_to_go + increment / 2
+    return max(min(budget, clock / 2) - MOVE_OVERHEAD, 1) / 1000
+
+
+# uci engine reading commands from stdin while the search runs on its own thread, so stop and
+# isready are answered during a search
+class UciEngine:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.start_fen = ChessEngine.START_FEN
+        self.moves = []
+        self.search_thread = None
+        # set by stop or quit, the search then returns the move of its last completed iteration
+        self.stop_event = threading.Event()
+        # an infinite search holds its best move back until stop
+        self.infinite = False
+
+    # writes a line to the gui, from either thread
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    # the game position the gui set up, built fresh for every search, set_position already checked the moves
+    def get_game_state(self):
+        return self.play_moves(self.start_fen, self.moves)
+
+    # plays uci moves from a fen, raises ValueError on a move that isn't legal in the game
+    def play_moves(self, fen, moves):
+        gs = ChessEngine.GameState(fen)
+        for uci in moves:
+            move = gs.parse_uci_move(uci)
+            if move is None:
+                raise ValueError('illegal move ' + uci)
+            gs.make_move(move)
+        return gs
+
+    # handles one command, returns False on quit
+    def handle(self, line) -> bool:
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == 'uci':
+            self.send('id name ' + ENGINE_NAME)
+            self.send('id author ' + ENGINE_AUTHOR)
+            self.send(f'option name Hash type spin default {ChessAi.TT_SIZE_MB} min 1 max 4096')
+            self.send('option name OwnBook type check default ' + str(ChessAi.USE_BOOK).lower())
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            self.set_option(tokens)
+        elif command == 'ucinewgame':
+            self.stop_search()
+            ChessAi.tt = None
+        elif command == 'position':
+            self.set_position(tokens)
+        elif command == 'go':
+            self.go(tokens)
+        elif command == 'stop':
+            self.stop_search()
+        elif command == 'quit':
+            self.stop_search()
+            return False
+        return True
+
+    # setoption name <name> value <value>
+    def set_option(self, tokens):
+        if 'name' not in tokens:
+            return
+        name_end = tokens.index('value') if 'value' in tokens else len(tokens)
+        name = ' '.join(tokens[tokens.index('name') + 1:name_end]).lower()
+        value = ' '.join(tokens[name_end + 1:])
+        if name == 'hash' and value.isdigit():
+            self.stop_search()
+            ChessAi.TT_SIZE_MB = int(value)
+            ChessAi.tt = None
+        elif name == 'ownbook':
+            ChessAi.USE_BOOK = value.lower() == 'true'
+
+    # position startpos | fen <fen> followed by moves <uci moves>
+    def set_position(self, tokens):
+        moves_at = tokens.index('moves') if 'moves' in tokens else len(tokens)
+        if len(tokens) > 1 and tokens[1] == 'fen':
+            fen = ' '.join(tokens[2:moves_at])
+        else:
+            fen = ChessEngine.START_FEN
+        moves = tokens[moves_at + 1:]
+        # a bad fen or move keeps the previous position, searching part of the game would answer for the
+        # wrong position or even the wrong side
+        try:
+            self.play_moves(fen, moves)
+        except (ValueError, KeyError, IndexError) as error:
+            self.send('info string bad position: ' + str(error))
+            return
+        self.start_fen = fen
+        self.moves = moves
+
+    # go with depth, movetime, wtime, btime, winc, binc, movestogo, nodes or infinite
+    def go(self, tokens):
+        self.stop_search()
+        options = {}
+        for i, token in enumerate(tokens[:-1]):
+            if token in ('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo', 'nodes') and (
+                    tokens[i + 1].lstrip('-').isdigit()):
+                options[token] = int(tokens[i + 1])
+        self.infinite = 'infinite' in tokens
+        gs = self.get_game_state()
+        depth = min(options.get('depth', ChessAi.MAX_DEPTH), ChessAi.MAX_DEPTH)
+        time_limit = None if self.infinite else think_time(gs.white_to_move, options)
+        self.stop_event.clear()
+        self.search_thread = threading.Thread(target=self.search, daemon=True,
+                                              args=(gs, depth, time_limit, options.get('nodes')))
+        self.search_thread.start()
+
+    # runs on the search thread and sends an info line for every completed iteration, then the best move
+    def search(self, gs, depth, time_limit, max_nodes):
+        ChessAi.stop_event = self.stop_event
+        valid_moves = gs.get_valid_moves()
+        best_move = None
+        try:
+            if valid_moves:
+                start = time.perf_counter()
+
+                def report(completed, move, score, nodes):
+                    elapsed = time.perf_counter() - start
+                    # a book move comes without a search and so without a principal variation, nor does a
+                    # root where every move fails low, like when every move gets mated
+                    pv_line = ChessAi.pv_line if completed and ChessAi.pv_line else [move]
+                    pv = ' '.join(ChessEngine.move_to_uci(pv_move) for pv_move in pv_line)
+                    self.send(f'info depth {completed} score {uci_score(score, len(pv_line))} nodes {nodes} '
+                              f'nps {int(nodes / elapsed) if elapsed > 0 else 0} time {int(elapsed * 1000)} '
+                              f'pv {pv}')
+
+                queue = Queue()
+                ChessAi.get_negamax_move(gs, valid_moves, queue, depth, time_limit, max_nodes, report=report)
+                best_move = queue.get()
+        finally:
+            # the gui waits for a bestmove even if the search failed, and 0000 from a position with legal
+            # moves loses the game in most guis
+            if best_move is None and valid_moves:
+                best_move = valid_moves[0]
+            if self.infinite:
+                self.stop_event.wait()
+            self.send('bestmove ' + (ChessEngine.move_to_uci(best_move) if best_move is not None else '0000'))
+
+    # stops the search and waits for it to send its best move
+    def stop_search(self):
+        self.stop_event.set()
+        self.wait_for_search()
+
+    # waits for the search thread, which ends on its own unless the search is infinite
+    def wait_for_search(self):
+        if self.search_thread is not None:
+            self.search_thread.join()
+            self.search_thread = None
+
+
+def main():
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.stop_search()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import queue
+import random
+import time
+from multiprocessing import Process, Queue, RawValue
+from queue import Empty
+from Chess import ChessEngine
+from Chess import ChessAi
+from Chess import ChessParallel
+
+
+# stop signal for one search, set once the pool moves on from the search id it was made for or the
+# shared deadline passes, which a ponder search gets once the predicted move is played
+class SearchStop:
+    def __init__(self, active_search, search_id, deadline):
+        self.active_search = active_search
+        self.search_id = search_id
+        self.deadline = deadline
+
+    def is_set(self) -> bool:
+        return self.active_search.value != self.search_id or 0 < self.deadline.value <= time.time()
+
+
+# brings the worker's position up to date, only replaying moves when the game went a different way
+def sync_position(gs, start_fen, moves):
+    if gs is None or gs.start_fen != start_fen or gs.get_uci_moves() != moves[:gs.ply]:
+        gs = ChessEngine.GameState(start_fen)
+    for uci in moves[gs.ply:]:
+        move = gs.parse_uci_move(uci)
+        if move is None:
+            raise ValueError('illegal move ' + uci + ' in game from ' + start_fen)
+        gs.make_move(move)
+    return gs
+
+
+# long lived search process, its position, transposition table and other caches stay warm between moves
+def worker_loop(worker_id, requests, results, active_search, deadline, tt_name):
+    if tt_name is not None:
+        ChessAi.tt = ChessParallel.SharedTranspositionTable(name=tt_name)
+    # forked workers share the parent's random state, seeding each one makes the helpers shuffle the root
+    # moves differently
+    random.seed(worker_id)
+    gs = None
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        search_id, start_fen, moves, depth, time_limit, max_nodes = message
+        if active_search.value != search_id:
+            continue
+        gs = sync_position(gs, start_fen, moves)
+        ChessAi.stop_event = SearchStop(active_search, search_id, deadline)
+        # helpers with an odd id start one ply deeper
+        start_depth = min(depth, 1 + ChessParallel.HELPER_DEPTH_SKIP * (worker_id % 2))
+        best = []
+
+        # the second move of the best line is the reply the opponent is expected to play
+        def report(completed, move, score, searched):
+            pv = ChessAi.pv_line
+            ponder = ChessEngine.move_to_uci(pv[1]) if completed and len(pv) > 1 and pv[0] == move else None
+            best[:] = [completed, ChessEngine.move_to_uci(move) if move is not None else None, score, ponder]
+
+        # the move comes back through report, the queue stays in this process
+        ChessAi.get_negamax_move(gs, gs.get_valid_moves(), queue.Queue(), depth, time_limit, max_nodes, start_depth,
+                                 report)
+        completed, uci, score, ponder = best if best else (0, None, 0, None)
+        results.put((search_id, worker_id, completed, uci, score, ponder, ChessAi.nodes + ChessAi.q_nodes))
+    if tt_name is not None:
+        ChessAi.tt.close()
+
+
+# pool of persistent search processes, a search is sent as the start fen and the uci moves played,
+# with more than one worker they search lazy smp style and share one transposition table, between moves
+# the pool can ponder: search the position after the opponent's expected reply until it is played
+class SearchPool:
+    def __init__(self, workers=1):
+        self.workers = workers
+        self.shared_tt = ChessParallel.SharedTranspositionTable() if workers > 1 else None
+        self.requests = [Queue() for i in range(workers)]
+        self.results = Queue()
+        # id of the search the workers should be running, anything else makes them stop
+        self.active_search = RawValue('q', 0)
+        # time the workers stop at, 0 for none, only set when a ponder search becomes the real one
+        self.deadline = RawValue('d', 0.0)
+        self.search_id = 0
+        self.processes = [Process(target=worker_loop, daemon=True,
+                                  args=(i, self.requests[i], self.results, self.active_search, self.deadline,
+                                        self.shared_tt.name if self.shared_tt is not None else None))
+                          for i in range(workers)]
+        for process in self.processes:
+            process.start()
+        self.searching = False
+        # set once poll has reported the finished search
+        self.reported = True
+        self.finished = set()
+        # result of the last finished search: best move and expected reply in uci notation, completed depth
+        # and nodes
+        self.best_move = None
+        self.ponder_move = None
+        self.best_depth = 0
+        self.nodes = 0
+        # position of the running ponder search as (start fen, uci moves) and when it started
+        self.ponder_position = None
+        self.ponder_start = 0.0
+
+    # starts searching the game's current position in the background, when a ponder search is already on
+    # it the search keeps going with the time limit counted from the start of pondering, returns True then
+    def start_search(self, gs, time_limit=None, max_nodes=None, depth=ChessAi.MAX_DEPTH) -> bool:
+        position = (gs.start_fen, gs.get_uci_moves())
+        if self.ponder_position == position:
+            self.ponder_position = None
+            if time_limit is not None:
+                self.deadline.value = self.ponder_start + time_limit
+            return True
+        self.send_search(position, time_limit, max_nodes, depth)
+        return False
+
+    # searches the position after the expected reply to the last search's move until start_search is
+    # called, returns False if the last search found no reply or it isn't legal in the game
+    def ponder(self, gs) -> bool:
+        if self.ponder_move is None or gs.parse_uci_move(self.ponder_move) is None:
+            return False
+        position = (gs.start_fen, gs.get_uci_moves() + [self.ponder_move])
+        self.send_search(position, None, None, ChessAi.MAX_DEPTH)
+        self.ponder_position = position
+        self.ponder_start = time.time()
+        return True
+
+    # sends a new search to every worker, the ones still on an older search drop it
+    def send_search(self, position, time_limit, max_nodes, depth):
+        self.search_id += 1
+        self.deadline.value = 0.0
+        self.active_search.value = self.search_id
+        self.searching = True
+        self.reported = False
+        self.finished = set()
+        self.best_move = None
+        self.ponder_move = None
+        self.best_depth = 0
+        self.nodes = 0
+        self.ponder_position = None
+        if self.shared_tt is not None:
+            self.shared_tt.new_search()
+        worker_nodes = max_nodes // self.workers if max_nodes is not None else None
+        message = (self.search_id, position[0], position[1], depth, time_limit, worker_nodes)
+        for requests in self.requests:
+            requests.put(message)
+
+    # records one worker's result, once the main worker is done the helpers are stopped
+    def handle_result(self, message):
+        search_id, worker_id, depth, uci, score, ponder, searched = message
+        if search_id != self.search_id:
+            return
+        self.finished.add(worker_id)
+        self.nodes += searched
+        if uci is not None and (self.best_move is None or depth > self.best_depth):
+            self.best_move = uci
+            self.ponder_move = ponder
+            self.best_depth = depth
+        if worker_id == 0:
+            self.active_search.value = -self.search_id
+        if self.searching and len(self.finished) == self.workers:
+            self.searching = False
+
+    # collects results without blocking, returns True once when the search has finished, a ponder search
+    # only counts once start_search has taken it over
+    def poll(self) -> bool:
+        while self.searching:
+            try:
+                self.handle_result(self.results.get_nowait())
+            except Empty:
+                break
+        if self.searching or self.reported or self.ponder_position is not None:
+            return False
+        self.reported = True
+        return True
+
+    # waits for the current search and returns its best move in uci notation, not for ponder searches
+    # which only end once start_search gives them a time limit
+    def wait(self):
+        while self.searching:
+            self.handle_result(self.results.get())
+        self.reported = True
+        return self.best_move
+
+    # abandons the current or ponder search, its results are ignored when they arrive
+    def cancel(self):
+        self.active_search.value = -self.search_id
+        self.searching = False
+        self.reported = True
+        self.ponder_position = None
+
+    # stops the worker processes and frees the shared table
+    def close(self):
+        self.cancel()
+        for requests in self.requests:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+        if self.shared_tt is not None:
+            self.shared_tt.close()